@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Add the products.archived_at column (product archiving) to an existing database
+"""
+import sys
+from app import create_app, db
+from sqlalchemy import inspect, text
+
+def add_archived_column():
+    """Add archived_at and its index if the products table predates them"""
+    app = create_app()
+
+    with app.app_context():
+        columns = {column['name'] for column in inspect(db.engine).get_columns('products')}
+        if 'archived_at' in columns:
+            print("✅ products.archived_at already exists")
+            return True
+
+        print("🔄 Adding products.archived_at...")
+        column_type = 'TIMESTAMP' if db.engine.dialect.name == 'postgresql' else 'DATETIME'
+        try:
+            db.session.execute(text(f"ALTER TABLE products ADD COLUMN archived_at {column_type}"))
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_products_archived_at ON products (archived_at)"))
+            db.session.commit()
+            print("✅ products.archived_at added")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Adding products.archived_at failed: {e}")
+            return False
+
+if __name__ == '__main__':
+    sys.exit(0 if add_archived_column() else 1)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Create the indexes the models declare but an existing database lacks.
+
+db.create_all() only builds indexes together with new tables, so tables
+created before an index was added to the models (sales(sale_date,
+payment_type), the products (column, id) sort indexes, products.updated_at,
+...) never get it. This creates every missing one; it is safe to re-run.
+On Postgres the indexes are built CONCURRENTLY, so writes are not blocked.
+Indexes on columns that do not exist yet are skipped: run the column's own
+upgrade script (add_archived_column.py, recheck_low_stock.py) first.
+"""
+import sys
+from app import create_app, db
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+
+def missing_indexes():
+    '''(index, missing column names) for every declared index not in the database'''
+    inspector = inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                missing.append((index, [column.name for column in index.columns if column.name not in columns]))
+    return missing
+
+def add_indexes():
+    """Create missing tables, then every missing index"""
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        missing = missing_indexes()
+        if not missing:
+            print("✅ All indexes already exist")
+            return True
+
+        concurrently = db.engine.dialect.name == 'postgresql'
+        ok = True
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for index, absent in missing:
+                if absent:
+                    print(f"⚠️  Skipping {index.name}: {index.table.name} has no column {', '.join(absent)}")
+                    ok = False
+                    continue
+                ddl = str(CreateIndex(index).compile(dialect=db.engine.dialect))
+                if concurrently:
+                    ddl = ddl.replace('INDEX ', 'INDEX CONCURRENTLY ', 1)
+                print(f"🔄 Creating {index.name}...")
+                try:
+                    connection.exec_driver_sql(ddl)
+                except Exception as e:
+                    print(f"❌ Creating {index.name} failed: {e}")
+                    ok = False
+
+        print("✅ Indexes are up to date" if ok else "⚠️  Some indexes are still missing")
+        return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if add_indexes() else 1)
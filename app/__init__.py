@@ -3,8 +3,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import os
+from .db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
 def create_app(config_name=None):
@@ -17,14 +18,22 @@ def create_app(config_name=None):
     # Use the simple Config class for now
     app.config.from_object('config.Config')
 
+    from . import instrumentation
+    instrumentation.configure_engine(app)
+
     db.init_app(app)
     migrate.init_app(app, db)
 
     from .routes import main
     app.register_blueprint(main)
 
+    from . import cache
+    cache.init_app(app)
+
+    instrumentation.init_app(app, db)
+
     # Import models so they're registered
     with app.app_context():
-        from .models import user, products, sales
+        from .models import user, products, sales, summary, alerts, events, inventory
 
     return app
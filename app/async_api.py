@@ -0,0 +1,512 @@
+"""
+Versioned async JSON API for POS terminals, mounted at /api/v1.
+
+It is a Starlette app on an async SQLAlchemy engine (asyncpg / aiosqlite);
+asgi.py serves it in front of the Flask app, which keeps every other URL.
+An idle or long-polling connection is just a suspended coroutine, so
+thousands of polling tablets no longer each hold a worker thread.
+
+    GET  /api/v1/products            ?after=<id>&limit=&category=
+    GET  /api/v1/stock               ?ids=1,2,3[&since=<as_of>&wait=<seconds>]
+    POST /api/v1/stock               {"ids": [...]}
+    POST /api/v1/sales               {"items": [{"product_id", "quantity"}], "payment_type"}
+    GET  /api/v1/sales               ?before=<sale id>&limit=
+    GET  /api/v1/events              ?after=<event id>  (Server-Sent Events)
+
+Authentication reuses the Flask login: the signed session cookie issued by
+/login is verified here with the same secret.
+
+Stock lookups can long-poll: with since=<as_of from the previous answer>
+and wait=N the request is parked until stock changes or N seconds pass. A
+single watcher task per process polls max(products.updated_at) once a
+second and wakes the parked requests, so waiting clients cost no queries.
+
+The event stream pushes the live_events feed (see app.live_events) to
+dashboards. One EventFeed task per process reads new events once a second
+and fans them out to every open stream; a client resumes after a dropped
+connection from Last-Event-ID (or ?after= on first connect).
+
+Reads use the replica when one is configured, except for requests sent
+with X-Consistent-Read: 1 or from a client pinned to the primary after a
+write. Sales go through the same checkout() as the sync views, in a
+thread, so stock, rollup and cache invalidation behave identically.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from app.models.events import LiveEvent
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+
+MAX_BATCH_IDS = 500
+MAX_PAGE_SIZE = 200
+MAX_WAIT_SECONDS = 30
+WATCH_INTERVAL = 1.0  # seconds between stock-change and event polls
+EVENT_BUFFER = 1000  # recent events kept in memory per process
+EVENT_BATCH = 500  # events read per poll
+EVENT_LOOKBACK = 50  # ids re-read per poll, for transactions that commit out of id order
+HEARTBEAT_SECONDS = 15
+
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+STOCK_COLUMNS = (Product.id, Product.name, Product.price, Product.stock_level, Product.updated_at)
+
+def _error(message, status):
+    return JSONResponse({'error': message}, status_code=status)
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+# ============================================================================
+# Engines
+# ============================================================================
+
+def async_engine(url, options):
+    '''Async twin of a sync engine, with the same pool settings'''
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    options = dict(options)
+    options.pop('url', None)
+    if options.get('poolclass') is not NullPool:
+        # Only NullPool (PgBouncer) works for both; other pool classes, such
+        # as instrumentation's TimedQueuePool, are sync-only, so let the
+        # async dialect use its own AsyncAdaptedQueuePool with the same sizes
+        options.pop('poolclass', None)
+    connect_args = options.pop('connect_args', {})
+    if url.drivername == 'postgresql+asyncpg' and 'options' in connect_args:
+        # asyncpg takes server settings instead of libpq's "-c key=value" options
+        settings = dict(part.strip().split('=', 1) for part in connect_args['options'].split('-c ') if part.strip())
+        options['connect_args'] = {'server_settings': settings}
+    return create_async_engine(url, **options)
+
+class StockWatcher:
+    '''Polls max(products.updated_at) once per interval and wakes waiters'''
+
+    def __init__(self, engine, interval=WATCH_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self.version = None
+        self._changed = None
+        self._task = None
+
+    async def _poll(self):
+        while True:
+            try:
+                async with self.engine.connect() as connection:
+                    version = _iso(await connection.scalar(select(func.max(Product.updated_at))))
+                if version != self.version:
+                    self.version = version
+                    changed, self._changed = self._changed, asyncio.get_running_loop().create_future()
+                    changed.set_result(version)
+            except Exception:
+                pass  # a failed poll just delays wake-ups; waiters time out anyway
+            await asyncio.sleep(self.interval)
+
+    async def wait_for_change(self, seen, timeout):
+        '''Return once the version moves past seen (or after timeout) with the
+        version now current.'''
+        if self._task is None:
+            self._changed = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._poll())
+        if self.version is not None and self.version != seen:
+            return self.version
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._changed), timeout)
+        except asyncio.TimeoutError:
+            return self.version
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+class EventFeed:
+    '''Reads new live_events rows once per interval and wakes every stream.
+
+    Events are numbered in the order this process discovered them, so a
+    transaction that committed after a higher id had already been read is
+    still delivered (it is caught by the EVENT_LOOKBACK re-read).
+    '''
+
+    def __init__(self, engine, interval=WATCH_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self.buffer = deque(maxlen=EVENT_BUFFER)  # (sequence, row)
+        self.sequence = 0
+        self.watermark = 0
+        self._seen = set()
+        self._ready = asyncio.Event()
+        self._changed = None
+        self._task = None
+
+    async def _read(self, connection):
+        return (await connection.execute(
+            select(LiveEvent.id, LiveEvent.kind, LiveEvent.data)
+            .where(LiveEvent.id > self.watermark - EVENT_LOOKBACK)
+            .order_by(LiveEvent.id).limit(EVENT_BATCH)
+        )).all()
+
+    async def _poll(self):
+        self._changed = asyncio.get_running_loop().create_future()
+        while True:
+            try:
+                async with self.engine.connect() as connection:
+                    if not self._ready.is_set():
+                        # Start from now; older events are only read on resume
+                        self.watermark = await connection.scalar(select(func.max(LiveEvent.id))) or 0
+                        self._seen = {row.id for row in await self._read(connection)}
+                        self._ready.set()
+                        rows = []
+                    else:
+                        rows = [row for row in await self._read(connection) if row.id not in self._seen]
+                for row in rows:
+                    self.sequence += 1
+                    self.buffer.append((self.sequence, row))
+                    self._seen.add(row.id)
+                    self.watermark = max(self.watermark, row.id)
+                if rows:
+                    self._seen = {event_id for event_id in self._seen if event_id > self.watermark - EVENT_LOOKBACK}
+                    changed, self._changed = self._changed, asyncio.get_running_loop().create_future()
+                    changed.set_result(None)
+            except Exception:
+                pass  # retried on the next poll
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        '''Return the current sequence, once the feed is reading'''
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+        await self._ready.wait()
+        return self.sequence
+
+    async def since(self, sequence, timeout):
+        '''Events discovered after sequence, waiting up to timeout for some'''
+        if self.sequence <= sequence:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._changed), timeout)
+            except asyncio.TimeoutError:
+                return []
+        return [(number, row) for number, row in self.buffer if number > sequence]
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+# ============================================================================
+# Auth and routing
+# ============================================================================
+
+def _flask_session(request):
+    '''The Flask session dict from the signed cookie, or None'''
+    flask_app = request.app.state.flask_app
+    cookie = request.cookies.get(flask_app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+
+def login_required(endpoint):
+    @wraps(endpoint)
+    async def guarded(request):
+        session = _flask_session(request)
+        if not session or 'user_id' not in session:
+            return _error('Log in first; this API uses the same session as the web app.', 401)
+        request.state.session = session
+        return await endpoint(request)
+    return guarded
+
+def _pin_primary(request, response):
+    '''pin_primary() for this API: after a write, store primary_until in the
+    Flask session cookie so the client's next reads, here or on the Flask
+    pages, come from the primary'''
+    if request.app.state.replica is None:
+        return
+    flask_app = request.app.state.flask_app
+    interface = flask_app.session_interface
+    session = dict(request.state.session,
+                   primary_until=time.time() + flask_app.config.get('REPLICA_STICKY_SECONDS', 10))
+    samesite = interface.get_cookie_samesite(flask_app)
+    expires = datetime.now(timezone.utc) + flask_app.permanent_session_lifetime if session.get('_permanent') else None
+    response.set_cookie(
+        interface.get_cookie_name(flask_app),
+        interface.get_signing_serializer(flask_app).dumps(session),
+        expires=expires,
+        path=interface.get_cookie_path(flask_app),
+        domain=interface.get_cookie_domain(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        samesite=samesite.lower() if samesite else None,
+    )
+
+def _read_engine(request):
+    state = request.app.state
+    if state.replica is None or request.headers.get('X-Consistent-Read') == '1':
+        return state.primary
+    if request.state.session.get('primary_until', 0) > time.time():
+        return state.primary
+    return state.replica
+
+# ============================================================================
+# Endpoints
+# ============================================================================
+
+@login_required
+async def list_products(request):
+    """Active products in id order, seek-paginated with ?after=<last id>"""
+    try:
+        after = int(request.query_params.get('after', 0))
+        limit = max(1, min(int(request.query_params.get('limit', 50)), MAX_PAGE_SIZE))
+    except ValueError:
+        return _error('after and limit must be integers.', 400)
+
+    stmt = select(Product.id, Product.name, Product.category, Product.cost, Product.price,
+                  Product.stock_level, Product.updated_at).where(
+        ~Product.is_archived, Product.id > after
+    ).order_by(Product.id).limit(limit + 1)
+    if request.query_params.get('category'):
+        stmt = stmt.where(Product.category == request.query_params['category'])
+
+    async with _read_engine(request).connect() as connection:
+        rows = (await connection.execute(stmt)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return JSONResponse({
+        'products': [{
+            'product_id': row.id,
+            'name': row.name,
+            'category': row.category,
+            'cost': row.cost,
+            'price': row.price,
+            'stock_level': row.stock_level,
+            'updated_at': _iso(row.updated_at),
+        } for row in rows],
+        'next_after': rows[-1].id if rows and more else None,
+    })
+
+async def _stock_rows(engine, ids):
+    async with engine.connect() as connection:
+        return (await connection.execute(select(*STOCK_COLUMNS).where(Product.id.in_(ids)))).all()
+
+def _stock_payload(rows, ids):
+    found = {row.id for row in rows}
+    return {
+        'products': [{
+            'product_id': row.id,
+            'name': row.name,
+            'price': row.price,
+            'stock_level': row.stock_level,
+            'updated_at': _iso(row.updated_at),
+        } for row in rows],
+        'missing': [product_id for product_id in ids if product_id not in found],
+        'as_of': max((_iso(row.updated_at) for row in rows), default=None),
+    }
+
+@login_required
+async def stock(request):
+    """Stock for a batch of product ids in one query, optionally long-polling"""
+    try:
+        if request.method == 'POST':
+            body = await request.json()
+            ids = [int(product_id) for product_id in body['ids']]
+        else:
+            ids = [int(product_id) for product_id in request.query_params.get('ids', '').split(',') if product_id]
+        wait = min(float(request.query_params.get('wait', 0)), MAX_WAIT_SECONDS)
+    except (ValueError, TypeError, KeyError):
+        return _error('ids must be a list of integer product ids.', 400)
+    ids = list(dict.fromkeys(ids))
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        return _error(f'Ask for between 1 and {MAX_BATCH_IDS} ids.', 400)
+
+    engine = _read_engine(request)
+    rows = await _stock_rows(engine, ids)
+    since = request.query_params.get('since')
+    if since and wait > 0:
+        # Park until one of these products changes; the watcher wakes us at
+        # most once per poll, and only then is the batch queried again
+        watcher = request.app.state.watcher
+        deadline = time.monotonic() + wait
+        seen = watcher.version
+        while _stock_payload(rows, ids)['as_of'] == since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            version = await watcher.wait_for_change(seen, remaining)
+            if version == seen:
+                break
+            seen = version
+            rows = await _stock_rows(engine, ids)
+    return JSONResponse(_stock_payload(rows, ids))
+
+def _run_checkout(flask_app, lines, payment_type):
+    from app.checkout import checkout
+    with flask_app.app_context():
+        sale, sold = checkout(lines, payment_type)
+        return {
+            'sale_id': sale.id,
+            'total_amount': round(sale.total_amount, 2),
+            'total_cost': round(sale.total_cost, 2),
+            'total_profit': round(sale.total_profit, 2),
+            'payment_type': sale.payment_type,
+            'sale_date': _iso(sale.sale_date),
+            'items': [{'product_id': line.product_id, 'quantity': line.quantity} for line in sold],
+        }
+
+@login_required
+async def submit_sale(request):
+    """Sell a basket; answers with the sale and the sold products' new stock"""
+    from app.checkout import CheckoutError, json_lines
+    try:
+        lines, payment_type = json_lines(await request.json())
+        result = await run_in_threadpool(_run_checkout, request.app.state.flask_app, lines, payment_type)
+    except CheckoutError as e:
+        return _error(str(e), 409)
+    except (KeyError, TypeError, ValueError):
+        return _error('Each item needs an integer product_id and quantity.', 400)
+
+    # Read back from the primary: the terminal must see its own sale
+    ids = [item['product_id'] for item in result['items']]
+    result['stock'] = _stock_payload(await _stock_rows(request.app.state.primary, ids), ids)['products']
+    response = JSONResponse(result, status_code=201)
+    _pin_primary(request, response)
+    return response
+
+@login_required
+async def sales_history(request):
+    """Recent sales with their line items, newest first, in two queries"""
+    try:
+        before = request.query_params.get('before')
+        limit = max(1, min(int(request.query_params.get('limit', 50)), MAX_PAGE_SIZE))
+    except ValueError:
+        return _error('limit must be an integer.', 400)
+
+    stmt = select(Sale.id, Sale.total_amount, Sale.total_cost, Sale.payment_type, Sale.sale_date
+                  ).order_by(Sale.id.desc()).limit(limit)
+    if before:
+        try:
+            stmt = stmt.where(Sale.id < int(before))
+        except ValueError:
+            return _error('before must be a sale id.', 400)
+
+    async with _read_engine(request).connect() as connection:
+        sales = (await connection.execute(stmt)).all()
+        items = {}
+        if sales:
+            for item in await connection.execute(select(
+                    SalesItem.sale_id, SalesItem.product_id, SalesItem.product_name,
+                    SalesItem.quantity, SalesItem.unit_price
+            ).where(SalesItem.sale_id.in_([sale.id for sale in sales])).order_by(SalesItem.id)):
+                items.setdefault(item.sale_id, []).append({
+                    'product_id': item.product_id,
+                    'name': item.product_name,
+                    'quantity': item.quantity,
+                    'unit_price': item.unit_price,
+                })
+    return JSONResponse({
+        'sales': [{
+            'sale_id': sale.id,
+            'total_amount': round(sale.total_amount, 2),
+            'total_profit': round(sale.total_amount - sale.total_cost, 2),
+            'payment_type': sale.payment_type,
+            'sale_date': _iso(sale.sale_date),
+            'items': items.get(sale.id, []),
+        } for sale in sales],
+        'next_before': sales[-1].id if len(sales) == limit else None,
+    })
+
+def _sse(row):
+    return f'id: {row.id}\nevent: {row.kind}\ndata: {json.dumps(row.data)}\n\n'
+
+@login_required
+async def events(request):
+    """Live dashboard events as Server-Sent Events"""
+    try:
+        after = int(request.headers.get('last-event-id') or request.query_params.get('after') or 0)
+    except ValueError:
+        return _error('after must be an event id.', 400)
+    feed = request.app.state.events
+    engine = _read_engine(request)
+
+    async def stream():
+        sequence = await feed.start()
+        replayed = (after, after)
+        if after:
+            # Replay what this client missed, then follow the feed
+            async with engine.connect() as connection:
+                missed = (await connection.execute(
+                    select(LiveEvent.id, LiveEvent.kind, LiveEvent.data)
+                    .where(LiveEvent.id > after).order_by(LiveEvent.id).limit(EVENT_BUFFER + 1)
+                )).all()
+            if len(missed) > EVENT_BUFFER:
+                yield 'event: refresh\ndata: {}\n\n'
+                replayed = (after, feed.watermark)
+            else:
+                for row in missed:
+                    yield _sse(row)
+                replayed = (after, missed[-1].id if missed else after)
+        yield 'retry: 3000\n\n'
+        while True:
+            batch = await feed.since(sequence, HEARTBEAT_SECONDS)
+            if not batch:
+                yield ': keepalive\n\n'
+                continue
+            sequence = batch[-1][0]
+            for _, row in batch:
+                if not replayed[0] < row.id <= replayed[1]:
+                    yield _sse(row)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def create_asgi_app(flask_app, wsgi_threads=20):
+    '''One ASGI app: /api/v1 served natively, everything else handed to the
+    Flask app on a pool of wsgi_threads threads.'''
+    config = flask_app.config
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.flask_app = flask_app
+        app.state.primary = async_engine(config['SQLALCHEMY_DATABASE_URI'], config['SQLALCHEMY_ENGINE_OPTIONS'])
+        replica = config.get('SQLALCHEMY_BINDS', {}).get('replica')
+        app.state.replica = async_engine(replica['url'], replica) if replica else None
+        app.state.watcher = StockWatcher(app.state.replica or app.state.primary)
+        app.state.events = EventFeed(app.state.replica or app.state.primary)
+        try:
+            yield
+        finally:
+            await app.state.watcher.close()
+            await app.state.events.close()
+            await app.state.primary.dispose()
+            if app.state.replica is not None:
+                await app.state.replica.dispose()
+
+    return Starlette(routes=[
+        Mount('/api/v1', routes=[
+            Route('/products', list_products, methods=['GET']),
+            Route('/stock', stock, methods=['GET', 'POST']),
+            Route('/sales', sales_history, methods=['GET']),
+            Route('/sales', submit_sale, methods=['POST']),
+            Route('/events', events, methods=['GET']),
+        ]),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=wsgi_threads)),
+    ], lifespan=lifespan)
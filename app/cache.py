@@ -0,0 +1,197 @@
+"""
+Time-bucketed cache for dashboard and report aggregates.
+
+Entries are keyed by metric and inclusive date range. A range that ends
+before today only changes when history is rewritten (see below), so it is
+kept for CACHE_PAST_TTL. A range
+that includes today lives in the "today" bucket: its key carries a
+generation token that the write paths replace after they commit, so the
+next read recomputes instead of serving stale figures. CACHE_TODAY_TTL is
+only a safety net on top of that.
+
+Writes that can alter history (a bulk import renaming products,
+rebuilding the rollup) replace the global generation instead, which
+retires every entry at once.
+
+With a read replica configured, misses are computed on the replica
+unless a generation changed within REPLICA_STICKY_SECONDS, in which case
+the primary is used so a lagging replica cannot seed the cache with
+figures from before the write.
+
+Rendered pages are cached too (cached_page), keyed by the ETag of the
+page so they need no invalidation; CACHE_PAGE_TTL only bounds their life.
+
+The default backend is an in-process LRU, which is exact for a single
+worker process. Other processes cannot invalidate it, so with
+WEB_CONCURRENCY > 1 the cache stays off unless CACHE_URL points at Redis,
+where entries and generations are shared. Scripts (rebuild_sales_summary.py,
+import_products.py) can only reach a shared cache too; without one the web
+process picks up their changes within CACHE_PAST_TTL.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app
+from app.date_range import utc_today
+from app.db_routing import use_primary
+
+GLOBAL_GENERATION = 'generation:all'
+TODAY_GENERATION = 'generation:today'
+
+class MemoryCache:
+    '''Thread-safe in-process LRU with optional per-entry TTL'''
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value):
+        '''Store value only if key is absent; return whatever is stored'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = entry = (None, value)
+            return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisCache:
+    '''Shared backend; values are pickled, keys namespaced by prefix'''
+
+    def __init__(self, url, prefix='antestore:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_URL points at Redis but the redis package is not installed.')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def add(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), nx=True)
+        return self.get(key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+def init_app(app):
+    url = app.config.get('CACHE_URL')
+    if not app.config.get('CACHE_ENABLED', True):
+        backend = None
+    elif url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        backend = RedisCache(url)
+    elif app.config.get('WEB_CONCURRENCY', 1) > 1:
+        app.logger.warning('Aggregate cache disabled: %s worker processes cannot share an in-process '
+                           'cache; set CACHE_URL to a Redis URL to enable it.', app.config['WEB_CONCURRENCY'])
+        backend = None
+    else:
+        backend = MemoryCache(app.config.get('CACHE_MAX_ENTRIES', 512))
+    app.extensions['aggregate_cache'] = backend
+
+def _backend():
+    return current_app.extensions.get('aggregate_cache')
+
+def is_shared():
+    '''True when invalidations made here reach the web processes'''
+    return isinstance(_backend(), RedisCache)
+
+def _new_generation():
+    # Random tokens rather than counters: a generation lost to eviction or a
+    # Redis restart can never bring old entries back into use. The time
+    # prefix records when it changed.
+    return f'{time.time():.3f}-{uuid.uuid4().hex}'
+
+def _generation(backend, key):
+    return backend.get(key) or backend.add(key, _new_generation())
+
+def _changed_within(generations, seconds):
+    cutoff = time.time() - seconds
+    return any(float(generation.split('-', 1)[0]) > cutoff for generation in generations)
+
+def cached_aggregate(metric, start_date, end_date, compute, *args):
+    '''Return compute(*args) for metric over [start_date, end_date], from the
+    cache when possible. Cached values are shared: treat them as read-only.'''
+    backend = _backend()
+    if backend is None:
+        return compute(*args)
+
+    # Generations are read before computing, so a write that commits while
+    # we compute leaves this entry under a generation nobody reads any more
+    today = utc_today()
+    generations = [_generation(backend, GLOBAL_GENERATION)]
+    if end_date >= today:
+        generations.append(_generation(backend, TODAY_GENERATION))
+        ttl, bucket = current_app.config.get('CACHE_TODAY_TTL', 300), today
+    else:
+        ttl, bucket = current_app.config.get('CACHE_PAST_TTL', 3600), 'past'
+    key = f'{metric}:{start_date}:{end_date}:{bucket}:{":".join(generations)}'
+
+    value = backend.get(key)
+    if value is None:
+        if _changed_within(generations, current_app.config.get('REPLICA_STICKY_SECONDS', 10)):
+            with use_primary():
+                value = compute(*args)
+        else:
+            value = compute(*args)
+        backend.set(key, value, ttl)
+    return value
+
+def history_generation():
+    '''Token that changes whenever history is rewritten, or None without a cache'''
+    backend = _backend()
+    return _generation(backend, GLOBAL_GENERATION) if backend is not None else None
+
+def cached_page(key, render):
+    '''Rendered HTML for key, calling render() on a miss'''
+    backend = _backend()
+    if backend is None:
+        return render()
+    html = backend.get('page:' + key)
+    if html is None:
+        html = render()
+        backend.set('page:' + key, html, current_app.config.get('CACHE_PAGE_TTL', 3600))
+    return html
+
+def invalidate_today():
+    '''Call after committing a write that changes today's figures'''
+    backend = _backend()
+    if backend is not None:
+        backend.set(TODAY_GENERATION, _new_generation())
+
+def invalidate_all():
+    '''Call after committing a write that changes past days as well'''
+    backend = _backend()
+    if backend is not None:
+        backend.set(GLOBAL_GENERATION, _new_generation())
@@ -0,0 +1,138 @@
+import random
+import time
+from app import db
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+from app.models.summary import DailySalesSummary
+from app.cache import invalidate_today
+from app.stock_alerts import check_thresholds
+from app.live_events import publish, sale_event
+from app.stock_ledger import record_movements
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.01  # seconds, doubled per attempt
+
+SoldLine = namedtuple('SoldLine', 'product_id name quantity')
+
+class CheckoutError(Exception):
+    '''A basket that cannot be sold (unknown product, bad quantity, no stock)'''
+
+def merge_lines(lines):
+    '''Combine (product_id, quantity) pairs into {product_id: quantity},
+    keeping first-seen order.'''
+    basket = {}
+    for product_id, quantity in lines:
+        product_id, quantity = int(product_id), int(quantity)
+        if quantity <= 0:
+            raise CheckoutError('Quantities must be at least 1.')
+        basket[product_id] = basket.get(product_id, 0) + quantity
+    if not basket:
+        raise CheckoutError('The basket is empty.')
+    return basket
+
+def json_lines(data):
+    '''(product_id, quantity) lines and payment type from a JSON basket
+    {"items": [{"product_id", "quantity"}, ...], "payment_type"}; raises
+    TypeError/KeyError for anything shaped otherwise.'''
+    if not isinstance(data, dict):
+        raise TypeError('The body must be a JSON object.')
+    items = data.get('items', [])
+    payment_type = data.get('payment_type', 'Cash')
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise TypeError('items must be a list of objects.')
+    if not isinstance(payment_type, str):
+        raise TypeError('payment_type must be a string.')
+    return [(item['product_id'], item['quantity']) for item in items], payment_type
+
+def _is_contention(error):
+    '''Deadlock / serialization failure (Postgres) or a busy database (SQLite)'''
+    code = getattr(error.orig, 'pgcode', None)
+    return code in ('40001', '40P01') or 'database is locked' in str(error.orig)
+
+def checkout(lines, payment_type='Cash'):
+    '''Sell a basket of (product_id, quantity) lines as one sale.
+
+    Round-trips are independent of basket size: one SELECT validates every
+    product, then the stock decrement (one conditional CASE update), the
+    low-stock check, the sale, its line items and ledger movements
+    (executemany), the rollup and the live event are written in a single
+    transaction with one commit. Transactions that lose a lock race
+    are retried with jittered backoff. Returns (sale, [SoldLine, ...]).
+    '''
+    basket = merge_lines(lines)
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            result = _checkout_once(basket, payment_type)
+            invalidate_today()
+            return result
+        except OperationalError as e:
+            if attempt == MAX_ATTEMPTS or not _is_contention(e):
+                raise
+            time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+
+def _checkout_once(basket, payment_type):
+    try:
+        products = {product.id: product for product in
+                    Product.query.filter(Product.id.in_(basket)).all()}
+
+        missing = [product_id for product_id in basket if product_id not in products]
+        if missing:
+            raise CheckoutError(f'Unknown product id(s): {", ".join(map(str, missing))}.')
+        for product_id, quantity in basket.items():
+            product = products[product_id]
+            if product.is_archived:
+                raise CheckoutError(f'"{product.name}" is archived and can no longer be sold.')
+            if not product.is_in_stock(quantity):
+                raise CheckoutError(f'Insufficient stock for "{product.name}"! '
+                                    f'Only {product.stock_level} units available.')
+
+        # The check above is advisory; this conditional update is what
+        # actually guarantees stock never goes negative under concurrency
+        if Product.take_stock(basket) != len(basket):
+            raise CheckoutError('Stock changed while recording the sale; '
+                                'some items are no longer available.')
+        check_thresholds(basket)
+
+        sale = Sale(
+            total_amount=sum(products[pid].price * qty for pid, qty in basket.items()),
+            total_cost=sum(products[pid].cost * qty for pid, qty in basket.items()),
+            payment_type=payment_type,
+            sale_date=datetime.utcnow()
+        )
+        db.session.add(sale)
+        db.session.flush()
+        record_movements([dict(product_id=product_id, kind='sale', quantity=-quantity, sale_id=sale.id)
+                          for product_id, quantity in basket.items()])
+
+        db.session.execute(insert(SalesItem), [dict(
+            sale_id=sale.id,
+            product_id=product_id,
+            quantity=quantity,
+            unit_price=products[product_id].price,
+            unit_cost=products[product_id].cost,
+            product_name=products[product_id].name
+        ) for product_id, quantity in basket.items()])
+
+        DailySalesSummary.apply_sale(sale, [(
+            products[product_id].category,
+            quantity,
+            products[product_id].price * quantity,
+            products[product_id].cost * quantity
+        ) for product_id, quantity in basket.items()])
+
+        publish([sale_event(sale, [(products[product_id], quantity) for product_id, quantity in basket.items()])])
+
+        # Captured before commit expires the loaded products
+        sold = [SoldLine(product_id, products[product_id].name, quantity)
+                for product_id, quantity in basket.items()]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return sale, sold
@@ -0,0 +1,61 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) for read-only views.
+
+A view works out its validators from a cheap query, asks not_modified()
+whether the client's copy is still current and, if so, returns that 304
+straight away, before the payload is built or serialised. Otherwise it
+builds the response and passes it through with_validators().
+
+ETags are strong: they hash everything the body is derived from, and
+every write bumps the updated_at timestamps they are built from.
+Last-Modified is weaker: it has one-second resolution and a deleted row
+leaves max(updated_at) where it was. It is only sent, via
+with_validators(); not_modified() decides on the ETag alone, so a request
+with only If-Modified-Since always gets the full body.
+
+Full HTML pages go through conditional_page(), which adds the user and
+the query string to the fingerprint and keeps the rendered HTML in the
+page cache under the ETag, so an unchanged page is neither queried nor
+re-rendered for anyone who asks again.
+"""
+import hashlib
+from flask import Response, g, make_response, request, session
+from app.cache import cached_page
+
+def make_etag(*parts):
+    '''Strong ETag value from the parts that determine a response body'''
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return digest[:32]
+
+def _apply(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Session-protected data: browsers may keep it but must revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag):
+    '''A 304 response if the client's If-None-Match names this version, else None'''
+    if request.method not in ('GET', 'HEAD') or not request.if_none_match.contains(etag):
+        return None
+    return _apply(Response(status=304), etag, None)
+
+def with_validators(response, etag, last_modified=None):
+    return _apply(response, etag, last_modified)
+
+def conditional_page(fingerprint, last_modified, render):
+    '''Serve an HTML page validated by fingerprint (a tuple describing the
+    data it shows): 304 when the client's ETag is current, else cached or
+    fresh HTML. last_modified is only sent; it cannot see deletions.'''
+    if '_flashes' in session:
+        # One-off messages are part of the page; never cache around them
+        return render()
+    user = g.get('session_user')
+    etag = make_etag(request.path, sorted(request.args.items(multi=True)),
+                     user.id if user else None, user.username if user else None, fingerprint)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_validators(make_response(cached_page(etag, render)), etag, last_modified)
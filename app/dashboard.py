@@ -0,0 +1,50 @@
+from app import db
+from app.models.products import Product
+from app.models.summary import DailySalesSummary
+from app.models.events import LiveEvent
+from app.date_range import utc_today
+from sqlalchemy import func, case, select, true
+
+def dashboard_kpis(today=None):
+    '''Every dashboard KPI in a single row, computed in one round-trip.
+
+    Product figures and the sales rollup are aggregated in two one-row
+    subqueries that are cross joined, using conditional sums instead of a
+    separate filtered query per number.
+
+    last_event_id is the newest live event, read in the same statement so
+    it matches the figures exactly: a page showing these (possibly cached)
+    KPIs resumes the event stream from there and applies every later delta.
+    '''
+    if today is None:
+        today = utc_today()
+    first_day_of_month = today.replace(day=1)
+
+    product_stats = select(
+        func.count(Product.id).label('total_products'),
+        func.coalesce(func.sum(Product.price * Product.stock_level), 0).label('total_stock_value'),
+        func.coalesce(func.sum(case((Product.low_stock, 1), else_=0)), 0).label('low_stock_count'),
+    ).where(~Product.is_archived).subquery()
+
+    is_today = DailySalesSummary.day == today
+    sales_stats = select(
+        func.coalesce(func.sum(case((is_today, DailySalesSummary.revenue), else_=0)), 0).label('today_revenue'),
+        func.coalesce(func.sum(case((is_today, DailySalesSummary.cost), else_=0)), 0).label('today_cost'),
+        func.coalesce(func.sum(DailySalesSummary.revenue), 0).label('month_revenue'),
+        func.coalesce(func.sum(DailySalesSummary.cost), 0).label('month_cost'),
+    ).where(
+        DailySalesSummary.day >= first_day_of_month,
+        DailySalesSummary.day <= today
+    ).subquery()
+
+    last_event_id = select(func.coalesce(func.max(LiveEvent.id), 0)).scalar_subquery()
+
+    row = db.session.execute(
+        select(product_stats, sales_stats, last_event_id.label('last_event_id'))
+        .select_from(product_stats.join(sales_stats, true()))
+    ).mappings().one()
+
+    kpis = dict(row)
+    kpis['today_profit'] = kpis['today_revenue'] - kpis['today_cost']
+    kpis['month_profit'] = kpis['month_revenue'] - kpis['month_cost']
+    return kpis
@@ -0,0 +1,18 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_
+
+def utc_today():
+    '''Calendar day that sales are bucketed by (sale_date is stored in UTC)'''
+    return datetime.utcnow().date()
+
+def day_bounds(start_date, end_date=None):
+    '''Turn an inclusive range of calendar days into half-open [start, end) timestamps'''
+    if end_date is None:
+        end_date = start_date
+    return (datetime.combine(start_date, time.min),
+            datetime.combine(end_date + timedelta(days=1), time.min))
+
+def within_days(column, start_date, end_date=None):
+    '''Index-friendly filter for a timestamp column falling on the given days'''
+    start, end = day_bounds(start_date, end_date)
+    return and_(column >= start, column < end)
@@ -0,0 +1,62 @@
+"""
+Read-replica routing.
+
+When DATABASE_REPLICA_URL is set it becomes the "replica" bind, and views
+decorated with @read_replica run their queries there while every other
+request (and every flush) stays on the primary.
+
+Replicas lag, so a client that has just written is pinned to the primary
+for REPLICA_STICKY_SECONDS (pin_primary(), stored in its session) and sees
+its own writes. A request can also ask for the primary explicitly with an
+"X-Consistent-Read: 1" header.
+
+Without a replica configured all of this is a no-op.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    '''Session that sends reads to the replica while g.read_replica is set'''
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('read_replica'):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def replica_configured():
+    return REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+def pin_primary():
+    '''Read-your-writes: keep this client on the primary for a while after it writes'''
+    if replica_configured():
+        session['primary_until'] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+def _pinned_to_primary():
+    if request.headers.get('X-Consistent-Read') == '1':
+        return True
+    return session.get('primary_until', 0) > time.time()
+
+def read_replica(view):
+    '''Route a read-only view's queries to the replica when that is safe'''
+    @wraps(view)
+    def routed(*args, **kwargs):
+        g.read_replica = request.method in ('GET', 'HEAD') and replica_configured() and not _pinned_to_primary()
+        return view(*args, **kwargs)
+    return routed
+
+@contextmanager
+def use_primary():
+    '''Temporarily send this request's queries to the primary'''
+    previous = g.get('read_replica', False)
+    g.read_replica = False
+    try:
+        yield
+    finally:
+        g.read_replica = previous
@@ -0,0 +1,103 @@
+"""
+Streaming exports of sales line items.
+
+Rows come off a server-side cursor (yield_per / stream_results) and are
+encoded and optionally gzipped chunk by chunk, so memory stays flat and
+the header goes out before the query has even run.
+"""
+import csv
+import io
+import json
+import zlib
+from app import db
+from app.models.sales import Sale, SalesItem
+from app.date_range import within_days
+from sqlalchemy import select
+
+FETCH_SIZE = 1000
+FLUSH_BYTES = 64 * 1024
+
+EXPORT_COLUMNS = (
+    'sale_id', 'sale_date', 'payment_type', 'sale_total_amount', 'sale_total_cost',
+    'item_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'unit_cost',
+    'line_revenue', 'line_cost', 'line_profit',
+)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+def export_rows(start_date, end_date):
+    '''Yield one tuple per line item (EXPORT_COLUMNS order) in sale order'''
+    stmt = select(
+        Sale.id, Sale.sale_date, Sale.payment_type, Sale.total_amount, Sale.total_cost,
+        SalesItem.id, SalesItem.product_id, SalesItem.product_name, SalesItem.quantity,
+        SalesItem.unit_price, SalesItem.unit_cost,
+    ).join(SalesItem, SalesItem.sale_id == Sale.id).where(
+        within_days(Sale.sale_date, start_date, end_date)
+    ).order_by(Sale.sale_date, Sale.id, SalesItem.id).execution_options(yield_per=FETCH_SIZE)
+
+    for row in db.session.execute(stmt):
+        (sale_id, sale_date, payment_type, total_amount, total_cost, item_id,
+         product_id, product_name, quantity, unit_price, unit_cost) = row
+        revenue = quantity * unit_price
+        cost = quantity * unit_cost
+        yield (sale_id, sale_date.isoformat() if sale_date else None, payment_type,
+               round(total_amount, 2), round(total_cost, 2), item_id, product_id, product_name,
+               quantity, unit_price, unit_cost, round(revenue, 2), round(cost, 2),
+               round(revenue - cost, 2))
+
+def _buffered(lines):
+    '''Send the first line at once, then group lines into ~FLUSH_BYTES chunks'''
+    lines = iter(lines)
+    for line in lines:
+        yield line
+        break
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+def csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def encode(values):
+        writer.writerow(values)
+        line = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return line.encode('utf-8')
+
+    yield encode(EXPORT_COLUMNS)
+    for row in rows:
+        yield encode(row)
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield (json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n').encode('utf-8')
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            # Push the gzip header and first chunk out instead of buffering
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(start_date, end_date, fmt='csv', gzip=False):
+    '''Byte chunks for a sales export; nothing runs until iterated'''
+    encode = csv_lines if fmt == 'csv' else ndjson_lines
+    chunks = _buffered(encode(export_rows(start_date, end_date)))
+    return gzipped(chunks) if gzip else chunks
@@ -0,0 +1,283 @@
+"""
+Streaming product import / stock-take pipeline.
+
+Rows are read lazily from CSV (or .xlsx when openpyxl is installed),
+validated one by one and written in chunks: one lookup query per chunk to
+match existing products, then one executemany UPDATE, one executemany
+INSERT, the ledger movements and the low-stock check, committed once per
+chunk. Memory stays bounded by the chunk size
+and the capped error list, whatever the size of the file.
+
+Recognised columns (header names are case-insensitive):
+    id, name, category, cost, price, stock_level (or stock),
+    reorder_threshold, description
+
+Rows with an id update that product. Rows without an id are matched by
+exact name, updating the product if exactly one has that name and
+creating a new one otherwise. A stock-take file therefore only needs
+id (or name) and stock_level.
+"""
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+from app import db
+from app.models.products import Product
+from app.cache import invalidate_all
+from app.stock_alerts import check_thresholds
+from app.live_events import publish
+from app.stock_ledger import record_movements
+from sqlalchemy import insert, update
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+COLUMN_ALIASES = {'stock': 'stock_level', 'product_id': 'id'}
+FIELDS = ('name', 'category', 'cost', 'price', 'stock_level', 'reorder_threshold', 'description')
+REQUIRED_FOR_NEW = ('name', 'category', 'price')
+
+class ImportFileError(Exception):
+    '''The upload as a whole cannot be read (bad format, missing header)'''
+
+class ImportResult:
+    '''Counters plus per-row errors (capped) for one import run'''
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+# ============================================================================
+# Readers
+# ============================================================================
+
+def _normalise_header(header):
+    key = (header or '').strip().lower().replace(' ', '_')
+    return COLUMN_ALIASES.get(key, key)
+
+def _next_csv_row(reader):
+    '''Next row, or None at the end. The file is decoded as it is read, so
+    bad encoding or CSV syntax only shows up here, mid-import.'''
+    try:
+        return next(reader)
+    except StopIteration:
+        return None
+    except UnicodeDecodeError:
+        raise ImportFileError(f'The file is not valid UTF-8 (after line {reader.line_num}); save it as a UTF-8 CSV.')
+    except csv.Error as e:
+        raise ImportFileError(f'Line {reader.line_num} is not valid CSV: {e}.')
+
+def read_csv(stream):
+    '''Yield (line_number, row dict) from a binary or text CSV stream'''
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(stream)
+    header = _next_csv_row(reader)
+    if header is None:
+        raise ImportFileError('The file is empty.')
+    header = [_normalise_header(column) for column in header]
+    if 'id' not in header and 'name' not in header:
+        raise ImportFileError('The file needs an "id" or "name" column.')
+    while True:
+        row = _next_csv_row(reader)
+        if row is None:
+            return
+        if any(cell.strip() for cell in row):
+            yield reader.line_num, dict(zip(header, row))
+
+def read_xlsx(stream):
+    '''Yield (line_number, row dict) from the first sheet of an .xlsx file'''
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('Excel import needs openpyxl installed; upload a CSV instead.')
+    sheet = load_workbook(stream, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    try:
+        header = [_normalise_header(str(column) if column is not None else '') for column in next(rows)]
+    except StopIteration:
+        raise ImportFileError('The file is empty.')
+    if 'id' not in header and 'name' not in header:
+        raise ImportFileError('The file needs an "id" or "name" column.')
+    for line, row in enumerate(rows, start=2):
+        if any(cell not in (None, '') for cell in row):
+            yield line, {key: '' if cell is None else str(cell) for key, cell in zip(header, row)}
+
+def read_rows(stream, filename=''):
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        return read_xlsx(stream)
+    return read_csv(stream)
+
+# ============================================================================
+# Validation
+# ============================================================================
+
+def _number(raw, field, cast):
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValueError(f'{field} must be a number')
+    if value < 0:
+        raise ValueError(f'{field} cannot be negative')
+    return value
+
+def _whole_number(raw):
+    value = float(raw)
+    if not value.is_integer():
+        raise ValueError(raw)
+    return int(value)
+
+def parse_row(raw):
+    '''Turn a raw row into (id or None, {field: value}) or raise ValueError'''
+    values = {}
+    for field in FIELDS:
+        cell = (raw.get(field) or '').strip()
+        if not cell:
+            continue
+        if field in ('cost', 'price'):
+            values[field] = _number(cell, field, float)
+        elif field in ('stock_level', 'reorder_threshold'):
+            values[field] = _number(cell, field, _whole_number)
+        else:
+            values[field] = cell
+
+    if len(values.get('name', '')) > 100:
+        raise ValueError('name is longer than 100 characters')
+    if len(values.get('category', '')) > 50:
+        raise ValueError('category is longer than 50 characters')
+
+    product_id = (raw.get('id') or '').strip()
+    if product_id:
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            raise ValueError('id must be an integer')
+    if not product_id and 'name' not in values:
+        raise ValueError('each row needs an id or a name')
+    if not values:
+        raise ValueError('nothing to update')
+    return product_id or None, values
+
+# ============================================================================
+# Writer
+# ============================================================================
+
+def _write_chunk(chunk, result):
+    '''Match, then bulk update and bulk insert one validated chunk'''
+    ids = {product_id for _, product_id, _ in chunk if product_id}
+    names = {values['name'] for _, product_id, values in chunk if not product_id}
+
+    # Current stock, locked, for the ledger's import movements
+    stock_before = {}
+    if ids:
+        stock_before.update(db.session.query(Product.id, Product.stock_level)
+                            .filter(Product.id.in_(ids)).with_for_update())
+    known_ids = set(stock_before)
+    ids_by_name = {}
+    if names:
+        for row in db.session.query(Product.id, Product.name, Product.stock_level).filter(
+                Product.name.in_(names)).with_for_update():
+            ids_by_name.setdefault(row.name, []).append(row.id)
+            stock_before[row.id] = row.stock_level
+
+    now = datetime.utcnow()
+    updates, inserts, written = {}, {}, []
+    for line, product_id, values in chunk:
+        if product_id is None:
+            matches = ids_by_name.get(values['name'], [])
+            if len(matches) > 1:
+                result.error(line, f'name "{values["name"]}" matches {len(matches)} products; use the id column')
+                continue
+            product_id = matches[0] if matches else None
+        elif product_id not in known_ids:
+            result.error(line, f'unknown product id {product_id}')
+            continue
+
+        if product_id is not None:
+            updates.setdefault(product_id, {'id': product_id}).update(values, updated_at=now)
+        elif values['name'] in inserts:
+            inserts[values['name']].update(values)
+        else:
+            missing = [field for field in REQUIRED_FOR_NEW if field not in values]
+            if missing:
+                result.error(line, f'new product "{values["name"]}" is missing {", ".join(missing)}')
+                continue
+            inserts[values['name']] = dict({'cost': 0.0, 'stock_level': 0, 'description': ''},
+                                           created_at=now, updated_at=now, **values)
+        written.append(line)
+
+    try:
+        if updates:
+            db.session.execute(update(Product), list(updates.values()))
+        if inserts:
+            db.session.execute(insert(Product), list(inserts.values()))
+        inserted = {}
+        if inserts:
+            inserted = dict(db.session.query(Product.name, Product.id).filter(Product.name.in_(inserts)))
+        record_movements(
+            [dict(product_id=product_id, kind='import', quantity=values['stock_level'] - stock_before[product_id])
+             for product_id, values in updates.items() if 'stock_level' in values] +
+            [dict(product_id=product_id, kind='import', quantity=inserts[name]['stock_level'])
+             for name, product_id in inserted.items()]
+        )
+        check_thresholds(list(updates) + list(inserted.values()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for line in written:
+            result.error(line, f'chunk rejected by the database: {e.__class__.__name__}')
+        return
+    result.updated += len(updates)
+    result.created += len(inserts)
+
+def import_products(rows, chunk_size=CHUNK_SIZE):
+    '''Validate and upsert (line, raw row) pairs chunk by chunk. An
+    ImportFileError part-way through keeps the chunks already committed.'''
+    result = ImportResult()
+    rows = iter(rows)
+    try:
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            chunk = []
+            for line, raw in batch:
+                result.rows += 1
+                try:
+                    product_id, values = parse_row(raw)
+                except ValueError as e:
+                    result.error(line, str(e))
+                    continue
+                chunk.append((line, product_id, values))
+            if chunk:
+                _write_chunk(chunk, result)
+    except ImportFileError as e:
+        if not (result.created or result.updated):
+            raise
+        raise ImportFileError(f'{e} Rows before it were imported: '
+                              f'{result.created} created, {result.updated} updated.') from e
+    finally:
+        if result.created or result.updated:
+            # Live dashboards reload their figures rather than tracking every row
+            publish([('refresh', {})])
+            db.session.commit()
+            # Renamed or re-categorised products change past reports too
+            invalidate_all()
+    return result
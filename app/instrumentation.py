@@ -0,0 +1,294 @@
+"""
+Opt-in request instrumentation.
+
+INSTRUMENTATION_ENABLED turns on per-endpoint metrics: a request latency
+histogram, SQL statement count and SQL time, plus the slowest statements
+seen. They are served in Prometheus text format from /metrics (guarded by
+METRICS_TOKEN when set) and summarised per response in a Server-Timing
+header.
+
+QUERY_COUNT_HEADER adds X-Query-Count, the number of SQL statements the
+request executed, so regressions such as N+1 loads are visible straight
+from the browser or test client.
+
+With instrumentation enabled the connection pool is also measured: time
+spent waiting to check a connection out, checkout timeouts, and how much
+of the pool is in use, which is what DB_POOL_SIZE should be sized from.
+
+With both disabled nothing is registered at all. Metrics are kept per
+process; with several gunicorn workers each worker reports its own.
+"""
+import hmac
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+SLOW_STATEMENTS_KEPT = 10
+STATEMENT_PREVIEW = 200
+
+class EndpointStats:
+    '''Latency histogram and SQL totals for one endpoint'''
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+    def observe(self, seconds, sql_count, sql_seconds):
+        self.count += 1
+        self.latency_sum += seconds
+        self.sql_count += sql_count
+        self.sql_seconds += sql_seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[index] += 1
+                break
+
+class MetricsRegistry:
+    '''Process-wide metrics store, safe to update from worker threads'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_statements = []  # (seconds, endpoint, statement), slowest first
+        self.collectors = {}
+
+    def observe_request(self, endpoint, seconds, sql_count, sql_seconds):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.observe(seconds, sql_count, sql_seconds)
+
+    def observe_statement(self, endpoint, statement, seconds):
+        slow = self.slow_statements
+        if len(slow) >= SLOW_STATEMENTS_KEPT and seconds <= slow[-1][0]:
+            return
+        preview = ' '.join(statement.split())[:STATEMENT_PREVIEW]
+        with self._lock:
+            slow.append((seconds, endpoint, preview))
+            slow.sort(key=lambda entry: entry[0], reverse=True)
+            del slow[SLOW_STATEMENTS_KEPT:]
+
+    def add_collector(self, name, collector):
+        '''Register (or replace) a callable returning extra Prometheus text lines'''
+        self.collectors[name] = collector
+
+    def render(self):
+        '''Everything in Prometheus text exposition format'''
+        lines = [
+            '# HELP antestore_request_duration_seconds Request latency by endpoint.',
+            '# TYPE antestore_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            slow = list(self.slow_statements)
+
+        for endpoint, stats in endpoints:
+            label = f'endpoint="{_escape(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                cumulative += count
+                lines.append(f'antestore_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'antestore_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats.count}')
+            lines.append(f'antestore_request_duration_seconds_sum{{{label}}} {stats.latency_sum:.6f}')
+            lines.append(f'antestore_request_duration_seconds_count{{{label}}} {stats.count}')
+
+        for name, help_text, attribute, fmt in (
+            ('antestore_sql_statements_total', 'SQL statements executed by endpoint.', 'sql_count', '{}'),
+            ('antestore_sql_duration_seconds_total', 'Time spent in SQL by endpoint.', 'sql_seconds', '{:.6f}'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, stats in endpoints:
+                value = fmt.format(getattr(stats, attribute))
+                lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {value}')
+
+        lines.append('# HELP antestore_slow_sql_seconds Slowest SQL statements seen by this process.')
+        lines.append('# TYPE antestore_slow_sql_seconds gauge')
+        for rank, (seconds, endpoint, statement) in enumerate(slow, start=1):
+            lines.append(f'antestore_slow_sql_seconds{{rank="{rank}",endpoint="{_escape(endpoint)}",'
+                         f'statement="{_escape(statement)}"}} {seconds:.6f}')
+
+        for collector in list(self.collectors.values()):
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = MetricsRegistry()
+
+# ============================================================================
+# Connection pool
+# ============================================================================
+
+class PoolWaits:
+    '''Histogram of how long checkouts waited for a pooled connection'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * len(POOL_WAIT_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds, timed_out=False):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.timeouts += timed_out
+            for index, bound in enumerate(POOL_WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.bucket_counts[index] += 1
+                    break
+
+pool_waits = PoolWaits()
+
+class TimedQueuePool(QueuePool):
+    '''QueuePool that records how long each checkout waited'''
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_waits.observe(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_waits.observe(time.perf_counter() - started)
+        return connection
+
+def _pool_lines(engine, max_overflow):
+    pool = engine.pool
+    lines = [
+        '# HELP antestore_db_pool_checked_out Connections currently checked out of the pool.',
+        '# TYPE antestore_db_pool_checked_out gauge',
+        f'antestore_db_pool_checked_out {pool.checkedout()}',
+    ]
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(max_overflow, 0)
+        lines += [
+            '# HELP antestore_db_pool_size Configured pool size (DB_POOL_SIZE).',
+            '# TYPE antestore_db_pool_size gauge',
+            f'antestore_db_pool_size {pool.size()}',
+            '# HELP antestore_db_pool_overflow Connections open beyond pool_size (negative while the pool is filling).',
+            '# TYPE antestore_db_pool_overflow gauge',
+            f'antestore_db_pool_overflow {pool.overflow()}',
+            '# HELP antestore_db_pool_utilisation Checked-out connections as a fraction of pool_size + max_overflow.',
+            '# TYPE antestore_db_pool_utilisation gauge',
+            f'antestore_db_pool_utilisation {pool.checkedout() / capacity if capacity else 0:.4f}',
+        ]
+
+    waits = pool_waits
+    with waits._lock:
+        bucket_counts, count, seconds, timeouts = list(waits.bucket_counts), waits.count, waits.seconds, waits.timeouts
+    lines += [
+        '# HELP antestore_db_pool_wait_seconds Time spent waiting to check out a connection.',
+        '# TYPE antestore_db_pool_wait_seconds histogram',
+    ]
+    cumulative = 0
+    for bound, bucket_count in zip(POOL_WAIT_BUCKETS, bucket_counts):
+        cumulative += bucket_count
+        lines.append(f'antestore_db_pool_wait_seconds_bucket{{le="{bound}"}} {cumulative}')
+    lines += [
+        f'antestore_db_pool_wait_seconds_bucket{{le="+Inf"}} {count}',
+        f'antestore_db_pool_wait_seconds_sum {seconds:.6f}',
+        f'antestore_db_pool_wait_seconds_count {count}',
+        '# HELP antestore_db_pool_timeouts_total Checkouts that gave up after DB_POOL_TIMEOUT.',
+        '# TYPE antestore_db_pool_timeouts_total counter',
+        f'antestore_db_pool_timeouts_total {timeouts}',
+    ]
+    return lines
+
+def configure_engine(app):
+    '''Called before db.init_app: time pool checkouts when instrumented'''
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if app.config.get('INSTRUMENTATION_ENABLED') and 'pool_size' in options and 'poolclass' not in options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(options, poolclass=TimedQueuePool)
+
+# ============================================================================
+# Hooks
+# ============================================================================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if not has_request_context():
+        return
+    elapsed = time.perf_counter() - started
+    g.query_count = g.get('query_count', 0) + 1
+    g.query_seconds = g.get('query_seconds', 0.0) + elapsed
+    registry.observe_statement(request.endpoint or request.path, statement, elapsed)
+
+def _discard_timer(exception_context):
+    # The statement failed, so after_cursor_execute will not pop its timer
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+def _record_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    query_count = g.get('query_count', 0)
+    query_seconds = g.get('query_seconds', 0.0)
+    if request.endpoint != 'metrics':
+        registry.observe_request(request.endpoint or 'unmatched', elapsed, query_count, query_seconds)
+    response.headers.add('Server-Timing', f'db;desc="{query_count} queries";dur={query_seconds * 1000:.2f}')
+    response.headers.add('Server-Timing', f'total;dur={elapsed * 1000:.2f}')
+    return response
+
+def _add_query_count(response):
+    response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+    return response
+
+def metrics():
+    '''Prometheus scrape endpoint'''
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {token}'):
+            abort(401)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app, db):
+    enabled = app.config.get('INSTRUMENTATION_ENABLED')
+    count_header = app.config.get('QUERY_COUNT_HEADER')
+    if not enabled and not count_header:
+        return
+
+    with app.app_context():
+        engine = db.engine
+        engines = list(db.engines.values())  # the primary plus any replica bind
+    if enabled:
+        for bind in engines:
+            event.listen(bind, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(bind, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(bind, 'handle_error', _discard_timer)
+        app.before_request(_start_timer)
+        app.after_request(_record_request)
+        app.add_url_rule('/metrics', 'metrics', metrics)
+        max_overflow = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('max_overflow', 10)
+        registry.add_collector('db_pool', lambda: _pool_lines(engine, max_overflow))
+    else:
+        for bind in engines:
+            event.listen(bind, 'before_cursor_execute', _count_query)
+    if count_header:
+        app.after_request(_add_query_count)
@@ -0,0 +1,89 @@
+"""
+Change feed for live dashboards.
+
+Write paths call publish() before they commit, so an event is stored in
+the live_events table exactly when its change is. Each event carries the
+deltas it applies to the dashboard KPIs, so a screen that loaded the
+dashboard once can keep it current without recomputing anything.
+
+The async API streams the table as Server-Sent Events at /api/v1/events:
+one task per process reads new rows once a second and fans them out to
+every open connection. N open dashboards therefore cost one small query
+per second per process, instead of N KPI computations per poll.
+
+Kinds: sale, stock, low_stock, restocked, product_added, products_removed,
+products_restored, alerts_acknowledged, and refresh (reload the figures,
+sent after bulk imports whose deltas are not tracked).
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select
+from app import db
+from app.models.events import LiveEvent
+from app.models.products import Product
+
+EVENT_RETENTION = timedelta(hours=1)  # how far back a reconnecting client can resume
+PRUNE_EVERY = 200  # publishes between prunes of expired events, on average
+
+def publish(events):
+    '''Store [(kind, data), ...] in the current transaction; the caller commits'''
+    if not events:
+        return
+    now = datetime.utcnow()
+    db.session.execute(insert(LiveEvent), [dict(kind=kind, data=data, created_at=now, updated_at=now)
+                                           for kind, data in events])
+    if random.random() < 1 / PRUNE_EVERY:
+        db.session.execute(delete(LiveEvent).where(LiveEvent.created_at < now - EVENT_RETENTION))
+
+# ============================================================================
+# Event builders
+# ============================================================================
+
+def sale_event(sale, lines):
+    '''lines are (product, quantity) pairs, products as loaded before the sale'''
+    profit = sale.total_amount - sale.total_cost
+    return ('sale', {
+        'sale_id': sale.id,
+        'total_amount': round(sale.total_amount, 2),
+        'total_profit': round(profit, 2),
+        'payment_type': sale.payment_type,
+        'sale_date': sale.sale_date.isoformat(),
+        'items': [{'product_id': product.id, 'name': product.name, 'quantity': quantity,
+                   'stock_level': product.stock_level - quantity} for product, quantity in lines],
+        'kpis': {
+            'today_revenue': sale.total_amount,
+            'today_profit': profit,
+            'month_profit': profit,
+            'total_stock_value': -sum(product.price * quantity for product, quantity in lines),
+        },
+    })
+
+def stock_event(product, old_stock):
+    data = {'product_id': product.id, 'name': product.name, 'stock_level': product.stock_level}
+    if not product.is_archived:
+        data['kpis'] = {'total_stock_value': product.price * (product.stock_level - old_stock)}
+    return ('stock', data)
+
+def product_added_event(product):
+    return ('product_added', {
+        'product_id': product.id,
+        'name': product.name,
+        'stock_level': product.stock_level,
+        'kpis': {'total_products': 1, 'total_stock_value': product.price * product.stock_level},
+    })
+
+def catalogue_event(product_ids, leaving):
+    '''Event for products leaving (archived or deleted) or rejoining the active
+    catalogue. Call before the change, while their current state is readable.'''
+    already_gone = Product.is_archived if leaving else ~Product.is_archived
+    rows = db.session.execute(select(Product.id, Product.price, Product.stock_level, Product.low_stock).where(
+        Product.id.in_(product_ids), ~already_gone)).all()
+    sign = -1 if leaving else 1
+    return ('products_removed' if leaving else 'products_restored', {
+        'product_ids': [row.id for row in rows],
+        'kpis': {
+            'total_products': sign * len(rows),
+            'total_stock_value': sign * sum(row.price * row.stock_level for row in rows),
+            'low_stock_count': sign * sum(1 for row in rows if row.low_stock),
+        },
+    })
@@ -0,0 +1,35 @@
+from .. import db
+from .base_model import BaseModel
+from sqlalchemy import text
+
+class StockAlert(BaseModel):
+    '''A product that fell to its reorder threshold.
+
+    Written by app.stock_alerts in the same transaction as the stock change
+    that crossed the threshold. An alert stays open until someone
+    acknowledges it or the product is restocked above the threshold.
+    '''
+    __tablename__ = 'stock_alerts'
+    __table_args__ = (
+        # The dashboard and the alert feed only ever read open alerts
+        db.Index('ix_stock_alerts_open', 'product_id',
+                 postgresql_where=text('resolved_at IS NULL'), sqlite_where=text('resolved_at IS NULL')),
+    )
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_name = db.Column(db.String(100), nullable=False)
+    stock_level = db.Column(db.Integer, nullable=False)
+    threshold = db.Column(db.Integer, nullable=False)
+    resolved_at = db.Column(db.DateTime)
+    # 'acknowledged' or 'restocked'
+    resolution = db.Column(db.String(20))
+
+    def to_dict(self):
+        return {
+            'alert_id': self.id,
+            'product_id': self.product_id,
+            'name': self.product_name,
+            'stock_level': self.stock_level,
+            'threshold': self.threshold,
+            'created_at': self.created_at.isoformat(),
+        }
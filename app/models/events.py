@@ -0,0 +1,16 @@
+from .. import db
+from .base_model import BaseModel
+
+class LiveEvent(BaseModel):
+    '''One committed change, fanned out to live dashboards by app.live_events.
+
+    data is the event's JSON payload; its optional "kpis" dict holds the
+    deltas the change applies to the dashboard figures.
+    '''
+    __tablename__ = 'live_events'
+    __table_args__ = (
+        db.Index('ix_live_events_created_at', 'created_at'),
+    )
+
+    kind = db.Column(db.String(30), nullable=False)
+    data = db.Column(db.JSON, nullable=False)
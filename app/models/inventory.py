@@ -0,0 +1,34 @@
+from .. import db
+from .base_model import BaseModel
+
+class InventoryMovement(BaseModel):
+    '''One signed change to a product's stock, in the append-only ledger.
+
+    Written by app.stock_ledger in the same transaction as the change to
+    Product.stock_level; created_at is when it happened.
+    '''
+    __tablename__ = 'inventory_movements'
+    __table_args__ = (
+        # Per-product history, and the time-bounded delta scans after a snapshot
+        db.Index('ix_inventory_movements_product_id_created_at', 'product_id', 'created_at'),
+        db.Index('ix_inventory_movements_created_at', 'created_at'),
+    )
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    # 'sale', 'adjustment', 'receipt', 'import', or 'opening' for the balance
+    # a product had when the ledger was started
+    kind = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'))
+
+class StockSnapshot(BaseModel):
+    '''Every product's ledger balance at taken_at, so point-in-time queries
+    only replay the movements after the latest snapshot.'''
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('taken_at', 'product_id', name='uq_stock_snapshots_taken_at_product'),
+    )
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    stock_level = db.Column(db.Integer, nullable=False)
@@ -1,8 +1,22 @@
 from .. import db
 from .base_model import BaseModel
+from datetime import datetime
+from sqlalchemy import case, delete, exists, text, update
+from sqlalchemy.ext.hybrid import hybrid_property
 
 class Product(BaseModel):
     __tablename__ = 'products'
+    __table_args__ = (
+        # (sort column, id) pairs for keyset pagination of the inventory listing
+        db.Index('ix_products_category_id', 'category', 'id'),
+        db.Index('ix_products_stock_level_id', 'stock_level', 'id'),
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        # max(updated_at) is polled every second by the async API's stock watcher
+        db.Index('ix_products_updated_at', 'updated_at'),
+        # Only the few products below their reorder threshold are indexed
+        db.Index('ix_products_low_stock', 'stock_level', 'id',
+                 postgresql_where=text('low_stock'), sqlite_where=text('low_stock = 1')),
+    )
 
     name = db.Column(db.String(100), nullable=False, index=True)
     category = db.Column(db.String(50), nullable=False)
@@ -10,6 +24,12 @@ class Product(BaseModel):
     price = db.Column(db.Float, nullable=False, index=True)
     stock_level = db.Column(db.Integer, default=0, nullable=False)
     description = db.Column(db.Text)
+    # Archived products keep their sales history but are hidden and unsellable
+    archived_at = db.Column(db.DateTime, index=True)
+    # Reorder point; None falls back to Config.LOW_STOCK_THRESHOLD
+    reorder_threshold = db.Column(db.Integer)
+    # stock_level <= threshold, kept in step by app.stock_alerts on every stock write
+    low_stock = db.Column(db.Boolean, default=False, nullable=False)
 
     # FIXED: Changed from order_items to sales_items to match relationship
     sales_items = db.relationship('SalesItem', back_populates='product', cascade='all, delete-orphan')
@@ -17,13 +37,86 @@ class Product(BaseModel):
     def is_in_stock(self, quantity=1): 
         return self.stock_level >= quantity 
 
-    @property
-    def total_sold(self):
-        return sum(item.quantity for item in self.sales_items)
+    @hybrid_property
+    def is_archived(self):
+        return self.archived_at is not None
 
-    @property
-    def total_revenue(self):
-        return sum(item.get_subtotal() for item in self.sales_items)
+    @is_archived.expression
+    def is_archived(cls):
+        return cls.archived_at.isnot(None)
+
+    @classmethod
+    def set_archived(cls, product_ids, archived=True):
+        '''Archive (or restore) many products in one UPDATE; returns the count'''
+        # Only rows whose state actually changes, so the count is meaningful
+        unchanged = cls.archived_at.isnot(None) if archived else cls.archived_at.is_(None)
+        result = db.session.execute(
+            update(cls)
+            .where(cls.id.in_(product_ids), ~unchanged)
+            .values(archived_at=datetime.utcnow() if archived else None, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    @classmethod
+    def ids_with_sales(cls, product_ids):
+        '''The subset of product_ids that appear on at least one sale line'''
+        from .sales import SalesItem
+        return {product_id for product_id, in db.session.query(SalesItem.product_id).filter(
+            SalesItem.product_id.in_(product_ids)).distinct()}
+
+    @classmethod
+    def delete_many(cls, product_ids):
+        '''Delete products that were never sold, with their stock alerts and
+        ledger history, set-based in one transaction; returns the number
+        deleted. Products with sale lines are left alone: deleting them would
+        leave sale totals and the rollup disagreeing with the lines, so they
+        are archived instead.'''
+        from .sales import SalesItem
+        from .alerts import StockAlert
+        from .inventory import InventoryMovement, StockSnapshot
+        try:
+            # Locked, so a sale cannot add a line between the check and the delete
+            unsold = [product_id for product_id, in db.session.query(cls.id).filter(
+                cls.id.in_(product_ids), ~exists().where(SalesItem.product_id == cls.id)
+            ).with_for_update()]
+            if not unsold:
+                # Also drops anything the caller staged for the deletion
+                db.session.rollback()
+                return 0
+            for model in (StockAlert, InventoryMovement, StockSnapshot):
+                db.session.execute(
+                    delete(model).where(model.product_id.in_(unsold))
+                    .execution_options(synchronize_session=False)
+                )
+            result = db.session.execute(
+                delete(cls).where(cls.id.in_(unsold))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result.rowcount
+
+    @classmethod
+    def take_stock(cls, quantities):
+        '''Atomically decrement stock for {product_id: quantity}.
+
+        A single conditional UPDATE that only touches products which still
+        have enough stock, so concurrent sales can never oversell. Returns
+        the number of products updated; anything short of len(quantities)
+        means some product ran out and the caller must roll back.
+        '''
+        needed = case(quantities, value=cls.id, else_=0)
+        result = db.session.execute(
+            update(cls)
+            .where(cls.id.in_(quantities), cls.stock_level >= needed)
+            .values(stock_level=cls.stock_level - needed, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
 
     def reduce_stock(self, quantity): 
         if self.is_in_stock(quantity):
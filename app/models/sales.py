@@ -1,16 +1,30 @@
 from .. import db
 from .base_model import BaseModel
+from .products import Product
 from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property, selectinload
 
 class Sale(BaseModel):
     __tablename__ = 'sales'
+    __table_args__ = (
+        # Leading sale_date column also serves plain date-range scans
+        db.Index('ix_sales_sale_date_payment_type', 'sale_date', 'payment_type'),
+    )
 
     total_amount = db.Column(db.Float, nullable=False)
     total_cost = db.Column(db.Float, nullable=False, default=0.0)  # NEW: Track total cost
     payment_type = db.Column(db.String(100), nullable=False)
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
 
-    items = db.relationship('SalesItem', back_populates='sale', cascade='all, delete-orphan', lazy='dynamic')
+    items = db.relationship('SalesItem', back_populates='sale', cascade='all, delete-orphan')
+
+    @classmethod
+    def history(cls, limit=50):
+        '''Most recent sales with their line items, loaded in two queries'''
+        return cls.query.options(selectinload(cls.items)).order_by(
+            cls.sale_date.desc()
+        ).limit(limit).all()
     
     @property
     def total_profit(self):
@@ -54,4 +68,23 @@ class SalesItem(BaseModel):  # FIXED: Changed from OrderItem to SalesItem
         subtotal = self.get_subtotal()
         if subtotal > 0:
             return (self.get_profit() / subtotal) * 100
-        return 0
\ No newline at end of file
+        return 0
+
+# Sales aggregates on Product, declared here because they need SalesItem.
+# They are correlated subqueries over ix_sales_items_product_id, deferred so
+# only queries that undefer (or sort by) them pay for the aggregation.
+Product.total_sold = column_property(
+    select(func.coalesce(func.sum(SalesItem.quantity), 0))
+    .where(SalesItem.product_id == Product.id)
+    .correlate_except(SalesItem)
+    .scalar_subquery(),
+    deferred=True
+)
+
+Product.total_revenue = column_property(
+    select(func.coalesce(func.sum(SalesItem.quantity * SalesItem.unit_price), 0.0))
+    .where(SalesItem.product_id == Product.id)
+    .correlate_except(SalesItem)
+    .scalar_subquery(),
+    deferred=True
+)
@@ -0,0 +1,138 @@
+from .. import db
+from .base_model import BaseModel
+from .products import Product
+from .sales import Sale, SalesItem
+from ..date_range import day_bounds
+from datetime import datetime
+from sqlalchemy import func, case, select, insert, delete, literal
+from sqlalchemy.dialects import postgresql, sqlite
+
+class DailySalesSummary(BaseModel):
+    '''Pre-aggregated sales per day x payment type x category.
+
+    Each sale is counted once in transaction_count, on the row of the
+    category of its first line item, so summing transaction_count over a
+    day or payment type gives the exact number of sales.
+    '''
+    __tablename__ = 'daily_sales_summary'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'payment_type', 'category', name='uq_daily_sales_summary_key'),
+    )
+
+    day = db.Column(db.Date, nullable=False, index=True)
+    payment_type = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cost = db.Column(db.Float, nullable=False, default=0.0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def profit(self):
+        return self.revenue - self.cost
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def apply_sale(cls, sale, lines):
+        '''Add a sale to the rollup inside the caller's transaction.
+
+        lines is an iterable of (category, quantity, revenue, cost); the
+        caller is responsible for committing.
+        '''
+        buckets = {}
+        for index, (category, quantity, revenue, cost) in enumerate(lines):
+            bucket = buckets.setdefault(category, [0.0, 0.0, 0, 0])
+            bucket[0] += revenue
+            bucket[1] += cost
+            bucket[2] += quantity
+            if index == 0:
+                bucket[3] += 1
+
+        day = sale.sale_date.date()
+        for category, (revenue, cost, units, transactions) in buckets.items():
+            cls._increment(day, sale.payment_type, category, revenue, cost, units, transactions)
+
+    @classmethod
+    def _increment(cls, day, payment_type, category, revenue, cost, units, transactions):
+        dialect = db.session.get_bind().dialect.name
+        values = dict(day=day, payment_type=payment_type, category=category,
+                      revenue=revenue, cost=cost, units=units, transaction_count=transactions)
+
+        if dialect in ('postgresql', 'sqlite'):
+            insert_fn = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert_fn(cls.__table__).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['day', 'payment_type', 'category'],
+                set_={
+                    'revenue': cls.__table__.c.revenue + stmt.excluded.revenue,
+                    'cost': cls.__table__.c.cost + stmt.excluded.cost,
+                    'units': cls.__table__.c.units + stmt.excluded.units,
+                    'transaction_count': cls.__table__.c.transaction_count + stmt.excluded.transaction_count,
+                    'updated_at': datetime.utcnow(),
+                }
+            )
+            db.session.execute(stmt)
+            return
+
+        row = cls.query.filter_by(day=day, payment_type=payment_type, category=category).with_for_update().first()
+        if row is None:
+            db.session.add(cls(**values))
+        else:
+            row.revenue += revenue
+            row.cost += cost
+            row.units += units
+            row.transaction_count += transactions
+
+    @classmethod
+    def rebuild(cls, start_date=None, end_date=None):
+        '''Recompute the rollup from raw sales, optionally for a date range.
+
+        Runs as two set-based statements and commits once.
+        '''
+        day = func.date(Sale.sale_date)
+        now = datetime.utcnow()
+
+        first_items = select(
+            SalesItem.sale_id,
+            func.min(SalesItem.id).label('first_item_id')
+        ).group_by(SalesItem.sale_id).subquery()
+
+        source = select(
+            day.label('day'),
+            Sale.payment_type,
+            Product.category,
+            func.sum(SalesItem.quantity * SalesItem.unit_price).label('revenue'),
+            func.sum(SalesItem.quantity * SalesItem.unit_cost).label('cost'),
+            func.sum(SalesItem.quantity).label('units'),
+            func.sum(case((SalesItem.id == first_items.c.first_item_id, 1), else_=0)).label('transaction_count'),
+            literal(now).label('created_at'),
+            literal(now).label('updated_at'),
+        ).select_from(SalesItem).join(Sale, SalesItem.sale_id == Sale.id).join(
+            Product, SalesItem.product_id == Product.id
+        ).join(
+            first_items, first_items.c.sale_id == Sale.id
+        ).group_by(day, Sale.payment_type, Product.category)
+
+        clear = delete(cls.__table__)
+        if start_date is not None:
+            clear = clear.where(cls.day >= start_date)
+            source = source.where(Sale.sale_date >= day_bounds(start_date)[0])
+        if end_date is not None:
+            clear = clear.where(cls.day <= end_date)
+            source = source.where(Sale.sale_date < day_bounds(end_date)[1])
+
+        try:
+            db.session.execute(clear)
+            result = db.session.execute(insert(cls.__table__).from_select(
+                ['day', 'payment_type', 'category', 'revenue', 'cost', 'units',
+                 'transaction_count', 'created_at', 'updated_at'],
+                source
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result.rowcount
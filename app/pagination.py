@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+class KeysetPage:
+    '''One page of a keyset (seek) paginated query'''
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(sort_key, value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_key, value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def _cursor_value(value, python_type):
+    '''value as python_type, raising TypeError if a cursor holds anything else'''
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is float and type(value) is int:
+        return float(value)
+    if type(value) is not python_type:
+        raise TypeError(f'cursor value is not {python_type.__name__}')
+    return value
+
+def decode_cursor(cursor, sort_key, column):
+    '''Return (value, id) from a cursor, or None if it is malformed or was
+    issued for a different sort column.'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        issued_for, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if issued_for != sort_key or type(row_id) is not int:
+            return None
+        if value is not None:
+            value = _cursor_value(value, column.type.python_type)
+        return value, row_id
+    except (ValueError, TypeError, binascii.Error, NotImplementedError):
+        return None
+
+def keyset_paginate(query, sort_key, column, id_column, descending=True,
+                    per_page=50, after=None, before=None):
+    '''Seek-paginate query ordered by (column, id), id being the tiebreaker.
+
+    after/before are cursors taken from a previous page's next_cursor /
+    prev_cursor. Each page is a single LIMIT query regardless of depth.
+    '''
+    after_key = decode_cursor(after, sort_key, column) if after else None
+    before_key = decode_cursor(before, sort_key, column) if before else None
+    backwards = before_key is not None and after_key is None
+
+    base = query
+    key = tuple_(column, id_column)
+    # Walking backwards flips both the seek comparison and the ordering
+    reverse = descending != backwards
+    if after_key is not None or before_key is not None:
+        value, row_id = after_key if not backwards else before_key
+        bound = tuple_(value, row_id)
+        query = query.filter(key < bound if reverse else key > bound)
+
+    if reverse:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    def cursor_for(row):
+        return encode_cursor(sort_key, getattr(row, column.key), getattr(row, id_column.key))
+
+    if backwards and not rows:
+        # Stepped back past the first row, e.g. after deletions: restart
+        return keyset_paginate(base, sort_key, column, id_column, descending, per_page)
+
+    if backwards:
+        rows.reverse()
+        next_cursor = cursor_for(rows[-1]) if rows else None
+        prev_cursor = cursor_for(rows[0]) if rows and more else None
+    else:
+        next_cursor = cursor_for(rows[-1]) if rows and more else None
+        prev_cursor = cursor_for(rows[0]) if rows and after_key is not None else None
+
+    return KeysetPage(rows, next_cursor, prev_cursor)
@@ -0,0 +1,177 @@
+from app import db
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+from app.models.summary import DailySalesSummary
+from app.date_range import within_days
+from collections import namedtuple
+from datetime import timedelta
+from sqlalchemy import func, case, select, tuple_
+
+CategoryStat = namedtuple('CategoryStat', 'category units_sold revenue cost profit')
+PaymentStat = namedtuple('PaymentStat', 'payment_type transaction_count revenue cost profit')
+
+CURRENT = 'current'
+PREVIOUS = 'previous'
+
+class PeriodTotals:
+    '''Running totals for one period, with per-category and per-payment breakdowns'''
+
+    def __init__(self):
+        self.revenue = 0.0
+        self.cost = 0.0
+        self.transactions = 0
+        self.categories = {}
+        self.payment_types = {}
+
+    @staticmethod
+    def _add(buckets, key, revenue, cost, units, transactions):
+        bucket = buckets.setdefault(key, [0.0, 0.0, 0, 0])
+        bucket[0] += revenue
+        bucket[1] += cost
+        bucket[2] += units
+        bucket[3] += transactions
+
+    def category_stats(self):
+        stats = [CategoryStat(category, units, revenue, cost, revenue - cost)
+                 for category, (revenue, cost, units, _) in self.categories.items()]
+        return sorted(stats, key=lambda stat: stat.profit, reverse=True)
+
+    def payment_stats(self):
+        stats = [PaymentStat(payment_type, transactions, revenue, cost, revenue - cost)
+                 for payment_type, (revenue, cost, _, transactions) in self.payment_types.items()]
+        return sorted(stats, key=lambda stat: stat.profit, reverse=True)
+
+# ============================================================================
+# Rollup scan
+# ============================================================================
+
+def _period_rows(start_date, end_date, prev_start_date):
+    '''Rollup rows for both periods, tagged with the period they belong to'''
+    period = case((DailySalesSummary.day >= start_date, CURRENT), else_=PREVIOUS)
+    return select(
+        period.label('period'),
+        DailySalesSummary.payment_type,
+        DailySalesSummary.category,
+        DailySalesSummary.revenue,
+        DailySalesSummary.cost,
+        DailySalesSummary.units,
+        DailySalesSummary.transaction_count,
+    ).where(
+        DailySalesSummary.day >= prev_start_date,
+        DailySalesSummary.day <= end_date
+    ).subquery()
+
+def _scan_grouping_sets(rows, periods):
+    '''Postgres: let the database produce every breakdown in one GROUPING SETS pass'''
+    stmt = select(
+        rows.c.period,
+        rows.c.category,
+        rows.c.payment_type,
+        func.grouping(rows.c.category).label('no_category'),
+        func.grouping(rows.c.payment_type).label('no_payment_type'),
+        func.sum(rows.c.revenue).label('revenue'),
+        func.sum(rows.c.cost).label('cost'),
+        func.sum(rows.c.units).label('units'),
+        func.sum(rows.c.transaction_count).label('transactions'),
+    ).group_by(func.grouping_sets(
+        tuple_(rows.c.period),
+        tuple_(rows.c.period, rows.c.category),
+        tuple_(rows.c.period, rows.c.payment_type),
+    ))
+
+    for row in db.session.execute(stmt):
+        totals = periods[row.period]
+        values = (row.revenue or 0, row.cost or 0, row.units or 0, row.transactions or 0)
+        if row.no_category and row.no_payment_type:
+            totals.revenue, totals.cost, _, totals.transactions = values
+        elif row.no_payment_type:
+            PeriodTotals._add(totals.categories, row.category, *values)
+        else:
+            PeriodTotals._add(totals.payment_types, row.payment_type, *values)
+
+def _scan_fallback(rows, periods):
+    '''Portable path (SQLite): one fine-grained GROUP BY, folded in Python'''
+    stmt = select(
+        rows.c.period,
+        rows.c.category,
+        rows.c.payment_type,
+        func.sum(rows.c.revenue).label('revenue'),
+        func.sum(rows.c.cost).label('cost'),
+        func.sum(rows.c.units).label('units'),
+        func.sum(rows.c.transaction_count).label('transactions'),
+    ).group_by(rows.c.period, rows.c.category, rows.c.payment_type)
+
+    for row in db.session.execute(stmt):
+        totals = periods[row.period]
+        values = (row.revenue or 0, row.cost or 0, row.units or 0, row.transactions or 0)
+        totals.revenue += values[0]
+        totals.cost += values[1]
+        totals.transactions += values[3]
+        PeriodTotals._add(totals.categories, row.category, *values)
+        PeriodTotals._add(totals.payment_types, row.payment_type, *values)
+
+def scan_periods(start_date, end_date, prev_start_date):
+    '''Aggregate current and previous period from a single rollup scan'''
+    periods = {CURRENT: PeriodTotals(), PREVIOUS: PeriodTotals()}
+    rows = _period_rows(start_date, end_date, prev_start_date)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _scan_grouping_sets(rows, periods)
+    else:
+        _scan_fallback(rows, periods)
+    return periods[CURRENT], periods[PREVIOUS]
+
+# ============================================================================
+# Report
+# ============================================================================
+
+def top_products(start_date, end_date, limit=10):
+    '''Best products by profit; needs line items, the rollup has no product dimension'''
+    profit = func.sum((SalesItem.unit_price - SalesItem.unit_cost) * SalesItem.quantity)
+    return db.session.query(
+        Product.name,
+        Product.category,
+        func.sum(SalesItem.quantity).label('units_sold'),
+        func.sum(SalesItem.quantity * SalesItem.unit_price).label('revenue'),
+        func.sum(SalesItem.quantity * SalesItem.unit_cost).label('cost'),
+        profit.label('profit')
+    ).join(SalesItem).join(Sale).filter(
+        within_days(Sale.sale_date, start_date, end_date)
+    ).group_by(Product.id).order_by(profit.desc()).limit(limit).all()
+
+def _change(current, previous):
+    return ((current - previous) / previous * 100) if previous > 0 else 0
+
+def build_report(start_date, end_date):
+    '''Figures for report.html over an inclusive date range, compared with the
+    period of the same length immediately before it.'''
+    period_days = (end_date - start_date).days + 1
+    prev_start_date = start_date - timedelta(days=period_days)
+
+    current, previous = scan_periods(start_date, end_date, prev_start_date)
+
+    total_revenue = current.revenue
+    total_cost = current.cost
+    total_profit = total_revenue - total_cost
+    total_sales_count = current.transactions
+    prev_profit = previous.revenue - previous.cost
+
+    return dict(
+        total_revenue=total_revenue,
+        total_cost=total_cost,
+        total_profit=total_profit,
+        profit_margin_percentage=(total_profit / total_revenue * 100) if total_revenue > 0 else 0,
+        total_sales_count=total_sales_count,
+        avg_sale_value=total_revenue / total_sales_count if total_sales_count > 0 else 0,
+        avg_profit_per_sale=total_profit / total_sales_count if total_sales_count > 0 else 0,
+        top_products=top_products(start_date, end_date),
+        category_stats=current.category_stats(),
+        payment_stats=current.payment_stats(),
+        period_days=period_days,
+        prev_revenue=previous.revenue,
+        prev_profit=prev_profit,
+        prev_sales_count=previous.transactions,
+        revenue_change=_change(total_revenue, previous.revenue),
+        profit_change=_change(total_profit, prev_profit),
+        sales_change=_change(total_sales_count, previous.transactions),
+    )
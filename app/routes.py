@@ -1,14 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app, Response, stream_with_context, g
 from app.models.user import User
 from app.models.products import Product
-from app.models.sales import Sale, SalesItem
+from app.models.sales import Sale
+from app.models.summary import DailySalesSummary
+from app.date_range import utc_today
+from app.dashboard import dashboard_kpis
+from app.reporting import build_report
+from app.cache import cached_aggregate, invalidate_today, history_generation
+from app.db_routing import read_replica, pin_primary
+from app.pagination import keyset_paginate
+from app.search import search_filter, ranked_search
+from app.checkout import checkout, json_lines, CheckoutError
+from app.stock_alerts import check_thresholds, default_threshold, open_alerts, acknowledge
+from app.live_events import publish, stock_event, product_added_event, catalogue_event
+from app.conditional import make_etag, not_modified, with_validators, conditional_page
+from app.stock_ledger import record_movements, stock_at, stock_valuation
+from app.importer import import_products as run_product_import, read_rows, ImportFileError
+from app.exporter import stream_export, FORMATS as EXPORT_FORMATS
 from app import db
-from datetime import datetime, date, timedelta
-from sqlalchemy import func, or_, and_
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
 from functools import wraps
+from collections import namedtuple
 
 main = Blueprint('main', __name__)
 
+# Rows shown in the dashboard's low-stock and alert lists
+LOW_STOCK_LIST_SIZE = 20
+
+# Most product ids one batched stock lookup may ask for
+STOCK_BATCH_LIMIT = 500
+
 # ============================================================================
 # Authentication Decorators
 # ============================================================================
@@ -22,10 +45,29 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Display identity carried in the signed session cookie
+SessionUser = namedtuple('SessionUser', 'id username')
+
+@main.before_app_request
+def load_session_user():
+    """Put the session identity on g; never touches the database"""
+    g.session_user = None
+    if 'user_id' in session and session.get('username'):
+        g.session_user = SessionUser(session['user_id'], session['username'])
+
 def get_current_user():
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    """Full User row for the logged-in user, loaded at most once per request"""
+    if 'user_id' not in session:
+        return None
+    if 'current_user' not in g:
+        g.current_user = db.session.get(User, session['user_id'])
+    return g.current_user
+
+def get_display_user():
+    """Username/id for templates, from the session when possible"""
+    if g.get('session_user') is not None:
+        return g.session_user
+    return get_current_user()
 
 # ============================================================================
 # Authentication Routes
@@ -77,123 +119,132 @@ def logout():
 
 @main.route('/dashboard')
 @login_required
+@read_replica
 def dashboard():
     """Dashboard with profit calculations"""
-    user = get_current_user()
-    
-    # Dashboard statistics
-    total_products = Product.query.count()
-    total_stock_value = db.session.query(
-        func.sum(Product.price * Product.stock_level)
-    ).scalar() or 0
-    low_stock_count = Product.query.filter(Product.stock_level <= 10).count()
-    
-    # Today's sales and profit
-    today = date.today()
-    today_revenue = db.session.query(func.sum(Sale.total_amount)).filter(
-        func.date(Sale.created_at) == today
-    ).scalar() or 0
-    
-    today_cost = db.session.query(func.sum(Sale.total_cost)).filter(
-        func.date(Sale.created_at) == today
-    ).scalar() or 0
-    
-    today_profit = today_revenue - today_cost
-    
-    # This month's profit
-    first_day_of_month = today.replace(day=1)
-    month_profit = db.session.query(
-        func.sum(Sale.total_amount - Sale.total_cost)
-    ).filter(
-        func.date(Sale.sale_date) >= first_day_of_month
-    ).scalar() or 0
-    
-    # Low stock products
-    low_stock_products = Product.query.filter(Product.stock_level <= 10).all()
+    user = get_display_user()
+    
+    # Dashboard statistics, today's and this month's figures in one query,
+    # with the live event id they are current to (updates resume from there)
+    today = utc_today()
+    kpis = cached_aggregate('dashboard_kpis', today.replace(day=1), today, dashboard_kpis, today)
+    
+    # Low stock products, read from the partial index of flagged products
+    low_stock_products = Product.query.filter(Product.low_stock, ~Product.is_archived).order_by(
+        Product.stock_level, Product.id).limit(LOW_STOCK_LIST_SIZE).all()
+    stock_alerts = open_alerts(limit=LOW_STOCK_LIST_SIZE)
     
     # Recent sales for activity
-    recent_activities = Sale.query.order_by(Sale.created_at.desc()).limit(10).all()
+    recent_activities = Sale.history(limit=10)
     
     return render_template('dashboard.html', 
                          user=user,
-                         total_products=total_products,
-                         total_stock_value=total_stock_value,
-                         today_revenue=today_revenue,
-                         today_profit=today_profit,
-                         month_profit=month_profit,
-                         low_stock_count=low_stock_count,
+                         total_products=kpis['total_products'],
+                         total_stock_value=kpis['total_stock_value'],
+                         today_revenue=kpis['today_revenue'],
+                         today_profit=kpis['today_profit'],
+                         month_profit=kpis['month_profit'],
+                         low_stock_count=kpis['low_stock_count'],
                          low_stock_products=low_stock_products,
-                         recent_activities=recent_activities)
-@main.route('/inventory')
-@login_required
-def inventory():
-    """Enhanced inventory management with filtering and search"""
-    user = get_current_user()
-    
-    # Get filter parameters
-    search = request.args.get('search', '').strip()
-    category = request.args.get('category', '')
-    stock_status = request.args.get('stock_status', '')
+                         stock_alerts=stock_alerts,
+                         recent_activities=recent_activities,
+                         last_event_id=kpis['last_event_id'])
+# Sort keys accepted by the inventory listing
+PRODUCT_SORT_COLUMNS = {
+    'name': Product.name,
+    'price': Product.price,
+    'stock': Product.stock_level,
+    'category': Product.category,
+    'created_at': Product.created_at,
+    'sold': Product.total_sold,
+    'revenue': Product.total_revenue,
+}
+
+def inventory_filters():
+    """Filter, sort and cursor parameters for the inventory listing"""
     sort_by = request.args.get('sort_by', 'created_at')
-    sort_order = request.args.get('sort_order', 'desc')
-    
-    # Build query
-    query = Product.query
-    
-    # Apply search filter
-    if search:
-        search_filter = or_(
-            Product.name.contains(search),
-            Product.description.contains(search)
-        )
-        query = query.filter(search_filter)
+    if sort_by not in PRODUCT_SORT_COLUMNS:
+        sort_by = 'created_at'
+    return {
+        'search': request.args.get('search', '').strip(),
+        'category': request.args.get('category', ''),
+        'stock_status': request.args.get('stock_status', ''),
+        'sort_by': sort_by,
+        'sort_order': 'asc' if request.args.get('sort_order') == 'asc' else 'desc'
+    }
+
+def inventory_query(query, filters):
+    """Apply the inventory filters (not sorting or paging) to a product query"""
+    # Apply search filter (full-text index, prefix matched)
+    if filters['search']:
+        query = query.filter(search_filter(filters['search']))
     
     # Apply category filter
-    if category:
-        query = query.filter(Product.category == category)
+    if filters['category']:
+        query = query.filter(Product.category == filters['category'])
+    
+    # Archived products only show up when asked for
+    stock_status = filters['stock_status']
+    query = query.filter(Product.is_archived if stock_status == 'archived' else ~Product.is_archived)
     
     # Apply stock status filter
     if stock_status == 'low':
-        query = query.filter(Product.stock_level <= 10)
+        query = query.filter(Product.low_stock)
     elif stock_status == 'out':
         query = query.filter(Product.stock_level == 0)
     elif stock_status == 'in_stock':
-        query = query.filter(Product.stock_level > 10)
-    
-    # Apply sorting
-    if sort_by == 'name':
-        sort_column = Product.name
-    elif sort_by == 'price':
-        sort_column = Product.price
-    elif sort_by == 'stock':
-        sort_column = Product.stock_level
-    elif sort_by == 'category':
-        sort_column = Product.category
-    else:
-        sort_column = Product.created_at
-    
-    if sort_order == 'desc':
-        query = query.order_by(sort_column.desc())
-    else:
-        query = query.order_by(sort_column.asc())
-    
-    products = query.all()
+        query = query.filter(~Product.low_stock)
+    return query
+
+def inventory_page(filters):
+    """One keyset-paginated page of products matching the inventory filters"""
+    # Sales totals come from per-product subqueries, no line items loaded
+    query = Product.query.options(undefer(Product.total_sold), undefer(Product.total_revenue))
+    query = inventory_query(query, filters)
+    
+    # Apply sorting and seek to the requested page (id breaks ties)
+    per_page = current_app.config['ITEMS_PER_PAGE']
+    per_page = max(1, min(request.args.get('per_page', per_page, type=int), 200))
+    return keyset_paginate(
+        query,
+        filters['sort_by'],
+        PRODUCT_SORT_COLUMNS[filters['sort_by']],
+        Product.id,
+        descending=filters['sort_order'] == 'desc',
+        per_page=per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+
+@main.route('/inventory')
+@login_required
+@read_replica
+def inventory():
+    """Enhanced inventory management with filtering and search"""
+    user = get_display_user()
+    
+    filters = inventory_filters()
     
     # Get all categories for filter dropdown
     categories = db.session.query(Product.category).distinct().all()
     categories = [cat[0] for cat in categories]
     
-    return render_template('inventory.html', 
-                         products=products, 
-                         user=user,
-                         categories=categories,
-                         current_filters={
-                             'search': search,
-                             'category': category,
-                             'stock_status': stock_status,
-                             'sort_by': sort_by,
-                             'sort_order': sort_order
-                         })
+    # Every change to a listed product bumps its updated_at (sales included),
+    # and deletions lower the count: enough to tell if the page changed
+    count, last_modified = inventory_query(
+        db.session.query(func.count(Product.id), func.max(Product.updated_at)), filters).one()
+    
+    def render():
+        page = inventory_page(filters)
+        return render_template('inventory.html', 
+                             products=page.items, 
+                             page=page,
+                             user=user,
+                             categories=categories,
+                             default_threshold=default_threshold(),
+                             current_filters=filters)
+    
+    return conditional_page((count, last_modified, sorted(categories)), last_modified, render)
 
 @main.route('/add_product', methods=['POST'])
 @login_required
@@ -209,7 +260,14 @@ def add_product():
             description=request.form.get('description', '')
         )
         
-        product.save()
+        db.session.add(product)
+        db.session.flush()
+        record_movements([dict(product_id=product.id, kind='receipt', quantity=product.stock_level)])
+        publish([product_added_event(product)])
+        check_thresholds([product.id])
+        db.session.commit()
+        invalidate_today()
+        pin_primary()
         flash(f'Product "{product.name}" added successfully!', 'success')
     except ValueError as e:
         flash(f'Invalid input: Please check your numbers.', 'error')
@@ -218,22 +276,56 @@ def add_product():
     
     return redirect(url_for('main.inventory'))
 
+@main.route('/import_products', methods=['POST'])
+@login_required
+def import_products():
+    """Bulk product import / stock-take upload (CSV, or .xlsx with openpyxl)"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Please choose a CSV file to import.', 'error')
+        return redirect(url_for('main.inventory'))
+    
+    try:
+        result = run_product_import(read_rows(upload.stream, upload.filename))
+        pin_primary()
+    except ImportFileError as e:
+        flash(f'Import failed: {str(e)}', 'error')
+        return redirect(url_for('main.inventory'))
+    
+    flash(f'Import finished: {result.created} created, {result.updated} updated, '
+          f'{result.failed} row(s) failed.', 'success' if not result.failed else 'error')
+    for error in result.errors[:5]:
+        flash(f'Line {error["line"]}: {error["error"]}', 'error')
+    return redirect(url_for('main.inventory'))
+
 @main.route('/update_stock', methods=['POST'])
 @login_required
 def update_stock():
-    """Update product stock quantity"""
+    """Update product stock quantity and, optionally, its reorder threshold"""
     try:
         product_id = int(request.form['product_id'])
         new_stock = int(request.form['stock_level'])
+        threshold = request.form.get('reorder_threshold', '').strip()
+        threshold = int(threshold) if threshold else None
         
-        if new_stock < 0:
-            flash('Stock level cannot be negative.', 'error')
+        if new_stock < 0 or (threshold is not None and threshold < 0):
+            flash('Stock level and reorder threshold cannot be negative.', 'error')
             return redirect(url_for('main.inventory'))
         
-        product = Product.query.get_or_404(product_id)
+        # Locked, so a sale committing meanwhile cannot skew the ledger delta
+        product = Product.query.filter_by(id=product_id).with_for_update().first_or_404()
         old_stock = product.stock_level
         product.stock_level = new_stock
-        product.save()
+        if 'reorder_threshold' in request.form:
+            product.reorder_threshold = threshold
+        db.session.flush()
+        record_movements([dict(product_id=product.id, kind='adjustment', quantity=new_stock - old_stock)])
+        if new_stock != old_stock:
+            publish([stock_event(product, old_stock)])
+        check_thresholds([product.id])
+        db.session.commit()
+        invalidate_today()
+        pin_primary()
         
         flash(f'Stock updated for "{product.name}": {old_stock} → {new_stock}', 'success')
     except ValueError:
@@ -247,29 +339,98 @@ def update_stock():
 @login_required
 def delete_product(product_id):
     """Delete product"""
+    product = Product.query.get_or_404(product_id)
+    product_name = product.name
+    if Product.ids_with_sales([product_id]):
+        flash(f'Product "{product_name}" has sales history and cannot be deleted; archive it instead.', 'error')
+        return redirect(url_for('main.inventory'))
     try:
-        product = Product.query.get_or_404(product_id)
-        product_name = product.name
-        
-        # Delete associated order items first
-        sales_items = SalesItem.query.filter_by(product_id=product_id).all()
-        for item in sales_items:
-            item.delete()
-        
-        product.delete()
-        flash(f'Product "{product_name}" deleted successfully!', 'success')
+        # The product, its ledger rows and its live event go in one transaction
+        publish([catalogue_event([product_id], leaving=True)])
+        if Product.delete_many([product_id]):
+            invalidate_today()
+            pin_primary()
+            flash(f'Product "{product_name}" deleted successfully!', 'success')
+        else:
+            flash(f'Product "{product_name}" was just sold and cannot be deleted; archive it instead.', 'error')
     except Exception as e:
         flash(f'Error deleting product: {str(e)}', 'error')
     
     return redirect(url_for('main.inventory'))
 
+@main.route('/bulk_products', methods=['POST'])
+@login_required
+def bulk_products():
+    """Archive, restore or delete the products selected on the inventory page"""
+    action = request.form.get('action')
+    try:
+        product_ids = [int(product_id) for product_id in request.form.getlist('product_ids')]
+    except ValueError:
+        flash('Invalid product selection.', 'error')
+        return redirect(url_for('main.inventory'))
+    if not product_ids:
+        flash('Select at least one product first.', 'error')
+        return redirect(url_for('main.inventory'))
+    
+    try:
+        # Each action commits its live event together with the change
+        if action == 'archive':
+            publish([catalogue_event(product_ids, leaving=True)])
+            count = Product.set_archived(product_ids)
+            invalidate_today()
+            pin_primary()
+            flash(f'{count} product(s) archived; their sales history is kept.', 'success')
+        elif action == 'restore':
+            publish([catalogue_event(product_ids, leaving=False)])
+            count = Product.set_archived(product_ids, archived=False)
+            invalidate_today()
+            pin_primary()
+            flash(f'{count} product(s) restored.', 'success')
+        elif action == 'delete':
+            # Sold products keep their history; only never-sold ones are deleted
+            sold = Product.ids_with_sales(product_ids)
+            unsold = [product_id for product_id in product_ids if product_id not in sold]
+            count = 0
+            if unsold:
+                publish([catalogue_event(unsold, leaving=True)])
+                count = Product.delete_many(unsold)
+                invalidate_today()
+                pin_primary()
+            message = f'{count} product(s) deleted.'
+            if sold:
+                message += f' {len(sold)} with sales history were kept; archive them instead.'
+            flash(message, 'success' if count or not sold else 'error')
+        else:
+            flash('Unknown bulk action.', 'error')
+    except Exception as e:
+        flash(f'Error updating products: {str(e)}', 'error')
+    
+    # Stay on the archive view when working from it
+    if request.form.get('stock_status') == 'archived':
+        return redirect(url_for('main.inventory', stock_status='archived'))
+    return redirect(url_for('main.inventory'))
+
+@main.route('/stock_alerts/acknowledge', methods=['POST'])
+@login_required
+def acknowledge_stock_alerts():
+    """Acknowledge one stock alert (alert_id) or every open one"""
+    try:
+        alert_ids = [int(alert_id) for alert_id in request.form.getlist('alert_id')] or None
+    except ValueError:
+        flash('Invalid alert.', 'error')
+        return redirect(url_for('main.dashboard'))
+    count = acknowledge(alert_ids)
+    pin_primary()
+    flash(f'{count} stock alert(s) acknowledged.', 'success')
+    return redirect(url_for('main.dashboard'))
+
 @main.route('/sales')
 @login_required
 def sales():
     """Sales management with authentication"""
-    products = Product.query.filter(Product.stock_level > 0).all()
-    recent_sales = Sale.query.order_by(Sale.created_at.desc()).limit(50).all()
-    user = get_current_user()
+    products = Product.query.filter(~Product.is_archived, Product.stock_level > 0).all()
+    recent_sales = Sale.history(limit=50)
+    user = get_display_user()
     return render_template('sales.html', 
                          products=products, 
                          sales_history=recent_sales, 
@@ -278,47 +439,25 @@ def sales():
 @main.route('/record_sale', methods=['POST'])
 @login_required
 def record_sale():
-    """Record sale with profit tracking"""
+    """Record a sale of one or more products (cart checkout) with profit tracking"""
     try:
-        product_id = int(request.form['product_id'])
-        quantity = int(request.form['quantity'])
+        product_ids, quantities = request.form.getlist('product_id'), request.form.getlist('quantity')
+        if len(product_ids) != len(quantities):
+            raise ValueError('Every product needs a quantity.')
+        lines = zip(product_ids, quantities)
         payment_type = request.form.get('payment_type', 'Cash')
         
-        product = Product.query.get_or_404(product_id)
-        
-        if not product.is_in_stock(quantity):
-            flash(f'Insufficient stock! Only {product.stock_level} units available.', 'error')
-            return redirect(url_for('main.sales'))
-        
-        # Calculate totals
-        total_revenue = quantity * product.price
-        total_cost = quantity * product.cost  # Use product cost
-        total_profit = total_revenue - total_cost
+        sale, sold = checkout(lines, payment_type)
+        pin_primary()
+        total_profit = sale.total_amount - sale.total_cost
         
-        # Create sale record with cost tracking
-        sale = Sale(
-            total_amount=total_revenue,
-            total_cost=total_cost,  # NEW: Store total cost
-            payment_type=payment_type
-        )
-        sale.save()
-        
-        # Create order item with cost tracking
-        order_item = SalesItem(
-            sale_id=sale.id,
-            product_id=product_id,
-            quantity=quantity,
-            unit_price=product.price,
-            unit_cost=product.cost,  # NEW: Store unit cost
-            product_name=product.name
-        )
-        order_item.save()
-        
-        # Update product stock
-        if product.reduce_stock(quantity):
-            product.save()
-        
-        flash(f'Sale recorded: {quantity}x {product.name} - Revenue: ${total_revenue:.2f}, Profit: ${total_profit:.2f}', 'success')
+        if len(sold) == 1:
+            summary = f'{sold[0].quantity}x {sold[0].name}'
+        else:
+            summary = f'{len(sold)} products'
+        flash(f'Sale recorded: {summary} - Revenue: ${sale.total_amount:.2f}, Profit: ${total_profit:.2f}', 'success')
+    except CheckoutError as e:
+        flash(str(e), 'error')
     except ValueError as e:
         flash('Invalid input: Please check your numbers.', 'error')
     except Exception as e:
@@ -328,16 +467,17 @@ def record_sale():
 
 @main.route('/reports')
 @login_required
+@read_replica
 def reports():
     """Enhanced reports with profit calculations"""
-    user = get_current_user()
+    user = get_display_user()
     
     # Get date filter parameters
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     
     # Calculate preset dates
-    today = date.today()
+    today = utc_today()
     last_7_days = (today - timedelta(days=7)).strftime('%Y-%m-%d')
     last_30_days = (today - timedelta(days=30)).strftime('%Y-%m-%d')
     last_90_days = (today - timedelta(days=90)).strftime('%Y-%m-%d')
@@ -368,101 +508,66 @@ def reports():
         date_to = end_date.strftime('%Y-%m-%d')
         flash('Invalid date format. Using default date range.', 'error')
     
-    # Build date filter for sales
-    date_filter = and_(
-        func.date(Sale.sale_date) >= start_date,
-        func.date(Sale.sale_date) <= end_date
-    )
-    
-    # Calculate filtered statistics including profit
-    filtered_sales = Sale.query.filter(date_filter)
-    total_revenue = db.session.query(func.sum(Sale.total_amount)).filter(date_filter).scalar() or 0
-    total_cost = db.session.query(func.sum(Sale.total_cost)).filter(date_filter).scalar() or 0
-    total_profit = total_revenue - total_cost
-    total_sales_count = filtered_sales.count()
-    avg_sale_value = total_revenue / total_sales_count if total_sales_count > 0 else 0
-    avg_profit_per_sale = total_profit / total_sales_count if total_sales_count > 0 else 0
-    profit_margin_percentage = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
-    
-    # Top selling products with profit (filtered by date)
-    top_products = db.session.query(
-        Product.name,
-        Product.category,
-        func.sum(SalesItem.quantity).label('units_sold'),
-        func.sum(SalesItem.quantity * SalesItem.unit_price).label('revenue'),
-        func.sum(SalesItem.quantity * SalesItem.unit_cost).label('cost'),
-        func.sum((SalesItem.unit_price - SalesItem.unit_cost) * SalesItem.quantity).label('profit')
-    ).join(SalesItem).join(Sale).filter(date_filter).group_by(Product.id).order_by(
-        func.sum((SalesItem.unit_price - SalesItem.unit_cost) * SalesItem.quantity).desc()
-    ).limit(10).all()
-    
-    # Sales by category with profit (filtered by date)
-    category_stats = db.session.query(
-        Product.category,
-        func.sum(SalesItem.quantity).label('units_sold'),
-        func.sum(SalesItem.quantity * SalesItem.unit_price).label('revenue'),
-        func.sum(SalesItem.quantity * SalesItem.unit_cost).label('cost'),
-        func.sum((SalesItem.unit_price - SalesItem.unit_cost) * SalesItem.quantity).label('profit')
-    ).join(SalesItem).join(Sale).filter(date_filter).group_by(Product.category).order_by(
-        func.sum((SalesItem.unit_price - SalesItem.unit_cost) * SalesItem.quantity).desc()
-    ).all()
-    
-    # Sales by payment type (filtered by date)
-    payment_stats = db.session.query(
-        Sale.payment_type,
-        func.count(Sale.id).label('transaction_count'),
-        func.sum(Sale.total_amount).label('revenue'),
-        func.sum(Sale.total_cost).label('cost'),
-        func.sum(Sale.total_amount - Sale.total_cost).label('profit')
-    ).filter(date_filter).group_by(Sale.payment_type).order_by(
-        func.sum(Sale.total_amount - Sale.total_cost).desc()
-    ).all()
-    
-    # Calculate comparison with previous period
-    period_days = (end_date - start_date).days + 1
-    prev_start_date = start_date - timedelta(days=period_days)
-    prev_end_date = start_date - timedelta(days=1)
-    
-    prev_date_filter = and_(
-        func.date(Sale.sale_date) >= prev_start_date,
-        func.date(Sale.sale_date) <= prev_end_date
-    )
-    
-    prev_revenue = db.session.query(func.sum(Sale.total_amount)).filter(prev_date_filter).scalar() or 0
-    prev_cost = db.session.query(func.sum(Sale.total_cost)).filter(prev_date_filter).scalar() or 0
-    prev_profit = prev_revenue - prev_cost
-    prev_sales_count = Sale.query.filter(prev_date_filter).count()
-    
-    # Calculate percentage changes
-    revenue_change = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
-    profit_change = ((total_profit - prev_profit) / prev_profit * 100) if prev_profit > 0 else 0
-    sales_change = ((total_sales_count - prev_sales_count) / prev_sales_count * 100) if prev_sales_count > 0 else 0
-    
-    return render_template('report.html',
-                         user=user,
-                         total_revenue=total_revenue,
-                         total_cost=total_cost,
-                         total_profit=total_profit,
-                         profit_margin_percentage=profit_margin_percentage,
-                         total_sales_count=total_sales_count,
-                         avg_sale_value=avg_sale_value,
-                         avg_profit_per_sale=avg_profit_per_sale,
-                         top_products=top_products,
-                         category_stats=category_stats,
-                         payment_stats=payment_stats,
-                         date_from=date_from,
-                         date_to=date_to,
-                         period_days=period_days,
-                         prev_revenue=prev_revenue,
-                         prev_profit=prev_profit,
-                         prev_sales_count=prev_sales_count,
-                         revenue_change=revenue_change,
-                         profit_change=profit_change,
-                         sales_change=sales_change,
-                         last_7_days=last_7_days,
-                         last_30_days=last_30_days,
-                         last_90_days=last_90_days,
-                         today_str=today_str)
+    # Sales move the rollup rows of both compared periods; deletes and renames
+    # rewrite history and replace the history generation (or, without a
+    # cache, show up in the products' count and updated_at)
+    prev_start_date = start_date - timedelta(days=(end_date - start_date).days + 1)
+    rows, transactions, last_modified = db.session.query(
+        func.count(DailySalesSummary.id),
+        func.sum(DailySalesSummary.transaction_count),
+        func.max(DailySalesSummary.updated_at)
+    ).filter(DailySalesSummary.day >= prev_start_date, DailySalesSummary.day <= end_date).one()
+    history = history_generation() or tuple(
+        db.session.query(func.count(Product.id), func.max(Product.updated_at)).one())
+    fingerprint = (today, start_date, end_date, rows, transactions, last_modified, history)
+    
+    def render():
+        # Current and previous period from a single scan of the rollup
+        report = cached_aggregate('report', start_date, end_date, build_report, start_date, end_date)
+        return render_template('report.html',
+                             user=user,
+                             date_from=date_from,
+                             date_to=date_to,
+                             last_7_days=last_7_days,
+                             last_30_days=last_30_days,
+                             last_90_days=last_90_days,
+                             today_str=today_str,
+                             **report)
+    
+    return conditional_page(fingerprint, last_modified, render)
+
+
+@main.route('/export/sales')
+@login_required
+@read_replica
+def export_sales():
+    """Stream sales line items for a date range as CSV or NDJSON, optionally gzipped"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    use_gzip = request.args.get('gzip', '') in ('1', 'true', 'yes')
+    
+    today = utc_today()
+    try:
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        start_date = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else today - timedelta(days=30)
+        end_date = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else today
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format.'}), 400
+    if end_date < start_date:
+        return jsonify({'error': 'End date cannot be before start date.'}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f'sales_{start_date}_{end_date}.{extension}'
+    if use_gzip:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    
+    response = Response(stream_with_context(stream_export(start_date, end_date, fmt, use_gzip)),
+                        mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # ============================================================================
@@ -471,38 +576,208 @@ def reports():
 
 @main.route('/api/dashboard_data')
 @login_required
+@read_replica
 def api_dashboard_data():
     """API endpoint for dashboard data"""
-    total_products = Product.query.count()
-    total_stock_value = db.session.query(
-        func.sum(Product.price * Product.stock_level)
-    ).scalar() or 0
-    low_stock_count = Product.query.filter(Product.stock_level <= 10).count()
-    
-    today = date.today()
-    today_sales = db.session.query(func.sum(Sale.total_amount)).filter(
-        func.date(Sale.sale_date) == today
-    ).scalar() or 0
+    today = utc_today()
+    kpis = cached_aggregate('dashboard_kpis', today.replace(day=1), today, dashboard_kpis, today)
     
     return jsonify({
-        'total_products': total_products,
-        'total_stock_value': round(total_stock_value, 2),
-        'today_sales': round(today_sales, 2),
-        'low_stock_count': low_stock_count
+        'total_products': kpis['total_products'],
+        'total_stock_value': round(kpis['total_stock_value'], 2),
+        'today_sales': round(kpis['today_revenue'], 2),
+        'today_profit': round(kpis['today_profit'], 2),
+        'month_profit': round(kpis['month_profit'], 2),
+        'low_stock_count': kpis['low_stock_count']
+    })
+
+@main.route('/api/products')
+@login_required
+@read_replica
+def api_products():
+    """API endpoint for paginated product listing (infinite scroll)"""
+    page = inventory_page(inventory_filters())
+    return jsonify({
+        'products': [{
+            'product_id': product.id,
+            'name': product.name,
+            'category': product.category,
+            'cost': product.cost,
+            'price': product.price,
+            'stock_level': product.stock_level,
+            'total_sold': product.total_sold,
+            'total_revenue': round(product.total_revenue, 2)
+        } for product in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
     })
 
+@main.route('/api/products/search')
+@login_required
+@read_replica
+def api_product_search():
+    """API endpoint for ranked product search (typeahead)"""
+    term = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify({
+        'query': term,
+        'products': [{
+            'product_id': product.id,
+            'name': product.name,
+            'category': product.category,
+            'price': product.price,
+            'stock_level': product.stock_level
+        } for product in ranked_search(term, limit)]
+    })
+
+@main.route('/api/checkout', methods=['POST'])
+@login_required
+def api_checkout():
+    """API endpoint to sell a basket: {"items": [{"product_id", "quantity"}], "payment_type"}"""
+    try:
+        lines, payment_type = json_lines(request.get_json(silent=True))
+        sale, sold = checkout(lines, payment_type)
+        pin_primary()
+    except CheckoutError as e:
+        return jsonify({'error': str(e)}), 409
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each item needs an integer product_id and quantity.'}), 400
+    
+    return jsonify({
+        'sale_id': sale.id,
+        'total_amount': round(sale.total_amount, 2),
+        'total_cost': round(sale.total_cost, 2),
+        'total_profit': round(sale.total_profit, 2),
+        'payment_type': sale.payment_type,
+        'items': [{'product_id': line.product_id, 'quantity': line.quantity} for line in sold]
+    }), 201
+
+@main.route('/api/import_products', methods=['POST'])
+@login_required
+def api_import_products():
+    """API endpoint for bulk product import; reports every failed row"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'Upload the file as multipart field "file".'}), 400
+    
+    try:
+        result = run_product_import(read_rows(upload.stream, upload.filename))
+        pin_primary()
+    except ImportFileError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result.to_dict())
+
 @main.route('/api/product_stock/<int:product_id>')
 @login_required
+@read_replica
 def api_product_stock(product_id):
     """API endpoint to get current product stock"""
     product = Product.query.get_or_404(product_id)
-    return jsonify({
+    etag = make_etag(product.id, product.updated_at)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_validators(jsonify({
         'product_id': product.id,
         'name': product.name,
         'stock_level': product.stock_level,
         'price': product.price
+    }), etag, product.updated_at)
+
+@main.route('/api/product_stock', methods=['GET', 'POST'])
+@login_required
+@read_replica
+def api_product_stock_batch():
+    """API endpoint for the stock of many products in one query: ?ids=1,2,3 or POST {"ids": [...]}"""
+    try:
+        if request.method == 'POST':
+            ids = [int(product_id) for product_id in (request.get_json(silent=True) or {})['ids']]
+        else:
+            ids = [int(product_id) for product_id in request.args.get('ids', '').split(',') if product_id.strip()]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'ids must be a list of integer product ids.'}), 400
+    ids = list(dict.fromkeys(ids))
+    if not ids or len(ids) > STOCK_BATCH_LIMIT:
+        return jsonify({'error': f'Ask for between 1 and {STOCK_BATCH_LIMIT} ids.'}), 400
+    
+    rows = {row.id: row for row in db.session.query(
+        Product.id, Product.name, Product.stock_level, Product.price, Product.updated_at
+    ).filter(Product.id.in_(ids))}
+    
+    # Validators come from the rows alone, so a 304 skips building the payload.
+    # Only the ETag can tell a deleted id apart; its row's date is just gone
+    etag = make_etag(ids, sorted((row.id, row.updated_at) for row in rows.values()))
+    last_modified = max((row.updated_at for row in rows.values()), default=None)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    return with_validators(jsonify({
+        'products': [{
+            'product_id': product_id,
+            'name': rows[product_id].name,
+            'stock_level': rows[product_id].stock_level,
+            'price': rows[product_id].price
+        } for product_id in ids if product_id in rows],
+        'missing': [product_id for product_id in ids if product_id not in rows]
+    }), etag, last_modified)
+
+@main.route('/api/stock_alerts')
+@login_required
+@read_replica
+def api_stock_alerts():
+    """API endpoint for the open stock-alert queue; poll with ?after=<last alert_id>"""
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    alerts = open_alerts(after, limit)
+    return jsonify({
+        'alerts': [alert.to_dict() for alert in alerts],
+        'last_id': alerts[-1].id if alerts else after
+    })
+
+def parse_as_of(raw):
+    """Moment for point-in-time queries, as naive UTC like the stored timestamps:
+    YYYY-MM-DD means the end of that (UTC) day; a timestamp without an offset is UTC"""
+    if not raw:
+        return None
+    if len(raw) == 10:
+        return datetime.strptime(raw, '%Y-%m-%d') + timedelta(days=1)
+    moment = datetime.fromisoformat(raw)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@main.route('/api/stock_at')
+@login_required
+@read_replica
+def api_stock_at():
+    """API endpoint for stock on hand at a past moment: ?at=YYYY-MM-DD[THH:MM:SS]&ids=1,2,3"""
+    try:
+        at = parse_as_of(request.args.get('at'))
+        ids = [int(product_id) for product_id in request.args.get('ids', '').split(',') if product_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'at must be YYYY-MM-DD or an ISO timestamp and ids integers.'}), 400
+    if len(ids) > STOCK_BATCH_LIMIT:
+        return jsonify({'error': f'Ask for at most {STOCK_BATCH_LIMIT} ids.'}), 400
+    
+    levels = stock_at(at, ids or None)
+    return jsonify({
+        'at': (at or datetime.utcnow()).isoformat(),
+        'products': [{'product_id': product_id, 'stock_level': int(stock_level)}
+                     for product_id, stock_level in sorted(levels.items())]
     })
 
+@main.route('/api/stock_valuation')
+@login_required
+@read_replica
+def api_stock_valuation():
+    """API endpoint for units and value on hand at a past moment, per category"""
+    try:
+        at = parse_as_of(request.args.get('at'))
+    except ValueError:
+        return jsonify({'error': 'at must be YYYY-MM-DD or an ISO timestamp.'}), 400
+    return jsonify(dict(stock_valuation(at), at=(at or datetime.utcnow()).isoformat()))
+
 # ============================================================================
 # Context Processors
 # ============================================================================
@@ -510,4 +785,4 @@ def api_product_stock(product_id):
 @main.app_context_processor
 def inject_user():
     """Make current user available in all templates"""
-    return dict(current_user=get_current_user())
+    return dict(current_user=get_display_user())
@@ -0,0 +1,134 @@
+"""
+Product search backed by the database's own full-text index.
+
+* PostgreSQL: a weighted tsvector over name (A) and description (B) with a
+  GIN expression index; ranked by ts_rank.
+* SQLite: an FTS5 external-content table kept in sync by triggers; ranked
+  by bm25 with name weighted above description.
+* Anything else (or SQLite without FTS5): the old LIKE scan.
+
+Every token is matched as a prefix, so partial words work for typeahead.
+"""
+import re
+from app import db
+from app.models.products import Product
+from sqlalchemy import DDL, event, func, inspect, literal_column, or_, select, table, column, text
+
+FTS_TABLE = 'products_fts'
+
+# Must stay identical to the indexed expression so Postgres can use the index
+SEARCH_VECTOR = func.setweight(
+    func.to_tsvector(literal_column("'simple'"), func.coalesce(Product.name, literal_column("''"))), literal_column("'A'")
+).op('||')(func.setweight(
+    func.to_tsvector(literal_column("'simple'"), func.coalesce(Product.description, literal_column("''"))), literal_column("'B'")
+))
+
+POSTGRES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (("
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')))",
+]
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, content='products', content_rowid='id', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON products BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+]
+
+for statement in POSTGRES_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+_fts = table(FTS_TABLE, column('rowid'))
+_fts_ref = literal_column(FTS_TABLE)
+_backend_cache = {}
+
+def search_backend():
+    '''Which search implementation the current database supports'''
+    engine = db.session.get_bind()
+    if engine not in _backend_cache:
+        backend = 'like'
+        if engine.dialect.name == 'postgresql':
+            backend = 'postgresql'
+        elif engine.dialect.name == 'sqlite' and inspect(engine).has_table(FTS_TABLE):
+            backend = 'fts5'
+        _backend_cache[engine] = backend
+    return _backend_cache[engine]
+
+def tokenize(term):
+    '''Lower-cased word tokens; anything else is dropped so user input can
+    never inject query syntax.'''
+    return re.findall(r'\w+', term.lower())
+
+def _tsquery(tokens):
+    return func.to_tsquery(literal_column("'simple'"), ' & '.join(f'{token}:*' for token in tokens))
+
+def _fts_query(tokens):
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def _literal_match(term):
+    return or_(Product.name.contains(term, autoescape=True), Product.description.contains(term, autoescape=True))
+
+def search_filter(term):
+    '''Clause restricting a Product query to matches for term. A term with
+    no word tokens (only punctuation) is matched literally instead.'''
+    tokens = tokenize(term)
+    if not tokens:
+        return _literal_match(term)
+
+    backend = search_backend()
+    if backend == 'postgresql':
+        return SEARCH_VECTOR.op('@@')(_tsquery(tokens))
+    if backend == 'fts5':
+        return Product.id.in_(
+            select(_fts.c.rowid).where(_fts_ref.match(_fts_query(tokens)))
+        )
+    return _literal_match(term)
+
+def ranked_search(term, limit=10):
+    '''Top active (not archived) matches for term, best first, as a list of Product'''
+    tokens = tokenize(term)
+    if not tokens:
+        return []
+
+    backend = search_backend()
+    if backend == 'postgresql':
+        tsquery = _tsquery(tokens)
+        return Product.query.filter(SEARCH_VECTOR.op('@@')(tsquery), ~Product.is_archived).order_by(
+            func.ts_rank(SEARCH_VECTOR, tsquery).desc(), Product.id
+        ).limit(limit).all()
+
+    if backend == 'fts5':
+        # Rank inside the FTS table first so only `limit` products are loaded
+        rank = func.bm25(_fts_ref, 10.0, 1.0)
+        matches = select(_fts.c.rowid.label('id'), rank.label('rank')).join(
+            Product.__table__, Product.id == _fts.c.rowid
+        ).where(
+            _fts_ref.match(_fts_query(tokens)), ~Product.is_archived
+        ).order_by(rank).limit(limit).subquery()
+        return Product.query.join(matches, Product.id == matches.c.id).order_by(
+            matches.c.rank, Product.id
+        ).all()
+
+    return Product.query.filter(search_filter(term), ~Product.is_archived).order_by(Product.name, Product.id).limit(limit).all()
+
+def setup_search_index(rebuild=True):
+    '''Create the search index on an existing database and (re)fill it'''
+    engine = db.session.get_bind()
+    statements = {'postgresql': POSTGRES_DDL, 'sqlite': SQLITE_DDL}.get(engine.dialect.name, [])
+    for statement in statements:
+        db.session.execute(text(statement))
+    if rebuild and engine.dialect.name == 'sqlite':
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    db.session.commit()
+    _backend_cache.pop(engine, None)
+    return search_backend()
@@ -0,0 +1,98 @@
+"""
+Low-stock detection at write time.
+
+Every path that changes stock (checkout, manual stock updates, new
+products, imports) calls check_thresholds() with the ids it touched,
+before committing. One UPDATE ... RETURNING flips Product.low_stock for
+just the rows whose stock crossed their reorder threshold, and a
+StockAlert is queued for each product that fell to it, in the same
+transaction as the stock change. Restocking above the threshold resolves
+the product's open alerts. Both directions are published to the live
+event feed.
+
+Reads never rescan the product table: low-stock lists and counts filter
+on the flag, which is covered by a partial index holding only flagged
+products.
+"""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, insert, update
+from app import db
+from app.models.products import Product
+from app.models.alerts import StockAlert
+from app.live_events import publish
+
+def default_threshold():
+    return current_app.config.get('LOW_STOCK_THRESHOLD', 10)
+
+def threshold_expression():
+    '''Each product's reorder point, falling back to the configured default'''
+    return func.coalesce(Product.reorder_threshold, default_threshold())
+
+def check_thresholds(product_ids=None, queue_alerts=True):
+    '''Re-flag products (all of them when product_ids is None) whose stock
+    crossed their threshold and queue alerts; returns the new StockAlert
+    rows as dicts. Runs in the caller's transaction; the caller commits.'''
+    if product_ids is not None and not product_ids:
+        return []
+    threshold = threshold_expression()
+    is_low = Product.stock_level <= threshold
+    stmt = update(Product).where(Product.low_stock != is_low).values(low_stock=is_low)
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(list(product_ids)))
+    crossed = db.session.execute(
+        stmt.returning(Product.id, Product.name, Product.stock_level, Product.low_stock,
+                       Product.archived_at, threshold.label('threshold'))
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not queue_alerts or not crossed:
+        return []
+
+    now = datetime.utcnow()
+    restocked = [row.id for row in crossed if not row.low_stock]
+    if restocked:
+        db.session.execute(
+            update(StockAlert)
+            .where(StockAlert.product_id.in_(restocked), StockAlert.resolved_at.is_(None))
+            .values(resolved_at=now, resolution='restocked', updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    alerts = [dict(product_id=row.id, product_name=row.name, stock_level=row.stock_level,
+                   threshold=row.threshold, created_at=now, updated_at=now)
+              for row in crossed if row.low_stock and row.archived_at is None]
+    alert_ids = {}
+    if alerts:
+        alert_ids = dict(db.session.execute(
+            insert(StockAlert).returning(StockAlert.product_id, StockAlert.id, sort_by_parameter_order=True),
+            alerts
+        ).all())
+
+    # Archived products are not counted on the dashboard
+    publish([('low_stock' if row.low_stock else 'restocked', {
+        'alert_id': alert_ids.get(row.id),
+        'product_id': row.id,
+        'name': row.name,
+        'stock_level': row.stock_level,
+        'threshold': row.threshold,
+        'kpis': {'low_stock_count': 1 if row.low_stock else -1},
+    }) for row in crossed if row.archived_at is None])
+    return alerts
+
+def open_alerts(after_id=0, limit=50):
+    '''Unresolved alerts, oldest first, with ids above after_id'''
+    return StockAlert.query.filter(
+        StockAlert.resolved_at.is_(None), StockAlert.id > after_id
+    ).order_by(StockAlert.id).limit(limit).all()
+
+def acknowledge(alert_ids=None):
+    '''Resolve the given open alerts (all open alerts when None); returns the count'''
+    now = datetime.utcnow()
+    stmt = update(StockAlert).where(StockAlert.resolved_at.is_(None)).values(
+        resolved_at=now, resolution='acknowledged', updated_at=now)
+    if alert_ids is not None:
+        stmt = stmt.where(StockAlert.id.in_(alert_ids))
+    result = db.session.execute(stmt.execution_options(synchronize_session=False))
+    publish([('alerts_acknowledged', {'alert_ids': alert_ids})])
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,222 @@
+"""
+Append-only stock movement ledger.
+
+Every write that changes Product.stock_level also appends the signed
+change as an InventoryMovement, in the same transaction: sales
+(checkout), manual adjustments (update_stock), receipts (new products)
+and imports. A product's stock at any moment is the sum of its movements
+before that moment; the balance it had when the ledger was started is
+recorded once as an 'opening' movement (open_ledger()), net of any
+movements written before it ran.
+
+Snapshots keep that cheap. take_snapshot() checkpoints every product's
+balance, computed from the previous snapshot plus the movements since, so
+it never reads stock_level and cannot be skewed by sales in flight.
+stock_at() and stock_valuation() then read one snapshot plus the
+movements after it, an index range scan bounded by the snapshot interval.
+
+reconcile() checks stock_level against the ledger for every product in a
+single query; see reconcile_stock.py and snapshot_stock.py.
+"""
+from datetime import datetime
+from sqlalchemy import exists, func, insert, literal, select, union_all, update
+from sqlalchemy.orm import aliased
+from app import db
+from app.models.products import Product
+from app.models.inventory import InventoryMovement, StockSnapshot
+
+# Stands in for "no snapshot yet" so the movement scan stays a plain range
+LEDGER_EPOCH = datetime(1970, 1, 1)
+
+def record_movements(movements):
+    '''Append [{product_id, kind, quantity[, sale_id]}, ...] in the caller's
+    transaction; zero quantities are skipped. The caller commits.'''
+    now = datetime.utcnow()
+    rows = [dict({'sale_id': None}, created_at=now, updated_at=now, **movement)
+            for movement in movements if movement['quantity']]
+    if rows:
+        db.session.execute(insert(InventoryMovement), rows)
+
+# ============================================================================
+# Point-in-time reads
+# ============================================================================
+
+def _balances(when=None, product_ids=None):
+    '''Select of (product_id, stock_level) just before when (now if None): the
+    latest snapshot at or before it plus the movements after that snapshot.'''
+    latest = select(func.max(StockSnapshot.taken_at))
+    if when is not None:
+        latest = latest.where(StockSnapshot.taken_at <= when)
+    since = func.coalesce(latest.scalar_subquery(), LEDGER_EPOCH)
+
+    snapshot = select(StockSnapshot.product_id, StockSnapshot.stock_level.label('quantity')).where(
+        StockSnapshot.taken_at == latest.scalar_subquery())
+    movements = select(InventoryMovement.product_id, InventoryMovement.quantity).where(
+        InventoryMovement.created_at >= since)
+    if when is not None:
+        movements = movements.where(InventoryMovement.created_at < when)
+    if product_ids is not None:
+        snapshot = snapshot.where(StockSnapshot.product_id.in_(product_ids))
+        movements = movements.where(InventoryMovement.product_id.in_(product_ids))
+
+    ledger = union_all(snapshot, movements).subquery()
+    return select(
+        ledger.c.product_id,
+        func.sum(ledger.c.quantity).label('stock_level')
+    ).group_by(ledger.c.product_id)
+
+def stock_at(when=None, product_ids=None):
+    '''{product_id: units on hand} just before when, for products in the ledger'''
+    return dict(db.session.execute(_balances(when, product_ids)).all())
+
+def stock_valuation(when=None):
+    '''Units and value on hand just before when, per category and in total.
+
+    Values use today's cost and price; the catalogue keeps no price history.
+    '''
+    balances = _balances(when).subquery()
+    rows = db.session.execute(
+        select(
+            Product.category,
+            func.sum(balances.c.stock_level).label('units'),
+            func.sum(balances.c.stock_level * Product.cost).label('cost_value'),
+            func.sum(balances.c.stock_level * Product.price).label('retail_value'),
+        ).join(Product, Product.id == balances.c.product_id)
+        .group_by(Product.category).order_by(Product.category)
+    ).all()
+    categories = [{
+        'category': row.category,
+        'units': int(row.units or 0),
+        'cost_value': round(row.cost_value or 0, 2),
+        'retail_value': round(row.retail_value or 0, 2),
+    } for row in rows]
+    return {
+        'categories': categories,
+        'units': sum(category['units'] for category in categories),
+        'cost_value': round(sum(category['cost_value'] for category in categories), 2),
+        'retail_value': round(sum(category['retail_value'] for category in categories), 2),
+    }
+
+# ============================================================================
+# Maintenance
+# ============================================================================
+
+def _ledger_start():
+    '''When the ledger began: its first movement or snapshot, or None'''
+    first_movement = db.session.query(func.min(InventoryMovement.created_at)).scalar()
+    first_snapshot = db.session.query(func.min(StockSnapshot.taken_at)).scalar()
+    return min(filter(None, (first_movement, first_snapshot)), default=None)
+
+def open_ledger():
+    '''Record the opening balance of every product that predates the ledger;
+    returns how many were opened. Only the first run that finds such
+    products writes anything. Commits.
+
+    Sales and edits made before the ledger was opened already wrote their
+    movements, so the opening is stock_level minus those, dated when the
+    ledger began. Every such product gets one, zero if its movements add up,
+    which is what marks the ledger as opened: products created later start
+    with a receipt or import movement, and any difference they show is
+    drift for reconcile() to report, never a missing opening.
+
+    Snapshots taken before the opening did not include it; they are
+    corrected in the same transaction so stock_at() stays right between
+    them.'''
+    if db.session.query(exists().where(InventoryMovement.kind == 'opening')).scalar():
+        return 0
+    now = datetime.utcnow()
+    started = _ledger_start()
+    opened_at = started or now
+    moved = select(
+        InventoryMovement.product_id,
+        func.sum(InventoryMovement.quantity).label('quantity'),
+    ).group_by(InventoryMovement.product_id).subquery()
+    products = select(
+        Product.id, literal('opening'), Product.stock_level - func.coalesce(moved.c.quantity, 0),
+        literal(opened_at), literal(now)
+    ).outerjoin(moved, moved.c.product_id == Product.id)
+    if started is not None:
+        products = products.where(Product.created_at < started)
+
+    try:
+        result = db.session.execute(insert(InventoryMovement).from_select(
+            ['product_id', 'kind', 'quantity', 'created_at', 'updated_at'], products))
+        _add_openings_to_snapshots()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result.rowcount
+
+def _add_openings_to_snapshots():
+    '''Add each opening to the snapshots taken after it: to the product's
+    row where there is one, as a new row where there is not'''
+    opening = aliased(InventoryMovement)
+    applies = (opening.kind == 'opening') & (opening.quantity != 0) & (opening.created_at < StockSnapshot.taken_at)
+    db.session.execute(
+        update(StockSnapshot)
+        .where(exists().where(applies, opening.product_id == StockSnapshot.product_id))
+        .values(stock_level=StockSnapshot.stock_level + select(opening.quantity).where(
+            applies, opening.product_id == StockSnapshot.product_id).scalar_subquery())
+    )
+    taken = select(StockSnapshot.taken_at).distinct().subquery()
+    existing = aliased(StockSnapshot)
+    now = datetime.utcnow()
+    db.session.execute(insert(StockSnapshot).from_select(
+        ['product_id', 'taken_at', 'stock_level', 'created_at', 'updated_at'],
+        select(opening.product_id, taken.c.taken_at, opening.quantity, literal(now), literal(now))
+        .join(taken, opening.created_at < taken.c.taken_at)
+        .where(opening.kind == 'opening', opening.quantity != 0, ~exists().where(
+            existing.product_id == opening.product_id, existing.taken_at == taken.c.taken_at))
+    ))
+
+def take_snapshot(taken_at):
+    '''Checkpoint every product's ledger balance at taken_at, in one
+    INSERT ... SELECT; returns the number of rows, or None if that snapshot
+    already exists. Commits.
+
+    Take it a little in the past (e.g. last midnight) so that every
+    movement before taken_at has committed.'''
+    if db.session.query(exists().where(StockSnapshot.taken_at == taken_at)).scalar():
+        return None
+    now = datetime.utcnow()
+    balances = _balances(taken_at).subquery()
+    result = db.session.execute(insert(StockSnapshot).from_select(
+        ['product_id', 'taken_at', 'stock_level', 'created_at', 'updated_at'],
+        select(balances.c.product_id, literal(taken_at), balances.c.stock_level, literal(now), literal(now))
+    ))
+    db.session.commit()
+    return result.rowcount
+
+def _mismatches(product_ids=None, lock=False):
+    ledger = _balances(product_ids=product_ids).subquery()
+    ledger_level = func.coalesce(ledger.c.stock_level, 0)
+    stmt = select(Product.id, Product.name, Product.stock_level, ledger_level.label('ledger_level')).outerjoin(
+        ledger, ledger.c.product_id == Product.id
+    ).where(Product.stock_level != ledger_level).order_by(Product.id)
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(product_ids))
+    if lock:
+        stmt = stmt.with_for_update(of=Product)
+    return db.session.execute(stmt).all()
+
+def reconcile(fix=False):
+    '''Products whose stock_level disagrees with the ledger, as rows of
+    (id, name, stock_level, ledger_level), found in one query.
+
+    With fix=True each one gets an 'adjustment' movement for the
+    difference, after re-checking it under a row lock so a sale committing
+    meanwhile is not mistaken for drift.
+    '''
+    mismatches = _mismatches()
+    if not fix or not mismatches:
+        return mismatches
+    try:
+        confirmed = _mismatches([row.id for row in mismatches], lock=True)
+        record_movements([dict(product_id=row.id, kind='adjustment', quantity=row.stock_level - row.ledger_level)
+                          for row in confirmed])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return confirmed
@@ -0,0 +1,10 @@
+"""
+ASGI entry point: the async /api/v1 JSON API plus the Flask app behind it
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 2
+"""
+import os
+from app.async_api import create_asgi_app
+from run import app
+
+application = create_asgi_app(app, wsgi_threads=int(os.environ.get('WSGI_THREADS', 20)))
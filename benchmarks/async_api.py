@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Sync vs async stock polling, the way POS terminals use it.
+
+Starts the app twice on the same database, gunicorn (sync workers, the old
+deployment) and uvicorn (asgi.py), then for each:
+
+* lookup: every terminal fetches stock for a basket of --batch products.
+  Sync makes one /api/product_stock/<id> request per product; async makes
+  a single /api/v1/stock?ids= request.
+* polling: --terminals terminals keep watching their basket while a probe
+  measures how fast an ordinary request is answered. Sync terminals
+  re-fetch every --interval seconds; async terminals long-poll and sit
+  idle on the server until stock changes.
+
+Reports latency percentiles (per basket for lookups, per probe request
+while polling) as JSON.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.async_api --workers 2 --terminals 200
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from app import create_app, db
+from app.models.products import Product
+from benchmarks.datagen import BENCH_USER, ensure_bench_user, generate
+from benchmarks.load import summarise
+
+def login(base_url):
+    '''Log in once and return the Cookie header for every simulated terminal'''
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    username, password = BENCH_USER
+    opener.open(base_url + '/login', urllib.parse.urlencode({'username': username, 'password': password}).encode()).read()
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+def get(base_url, path, cookie, timeout=60):
+    request = urllib.request.Request(base_url + path, headers={'Cookie': cookie})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def fetch_basket(base_url, cookie, ids, mode):
+    '''Current stock of ids; returns the async as_of (None for sync)'''
+    if mode == 'sync':
+        for product_id in ids:
+            get(base_url, f'/api/product_stock/{product_id}', cookie)
+        return None
+    return get(base_url, '/api/v1/stock?ids=' + ','.join(map(str, ids)), cookie)['as_of']
+
+# ============================================================================
+# Servers
+# ============================================================================
+
+def start_server(mode, port, workers):
+    if mode == 'sync':
+        command = ['gunicorn', 'run:app', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                   '--log-level', 'warning']
+    else:
+        command = ['uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning']
+    process = subprocess.Popen(command, env=os.environ.copy())
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{mode} server did not start on port {port}')
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# ============================================================================
+# Scenarios
+# ============================================================================
+
+def lookup(base_url, cookie, mode, baskets, concurrency):
+    samples, errors, lock = [], [0], threading.Lock()
+    queue = list(baskets)
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                ids = queue.pop()
+            started = time.perf_counter()
+            try:
+                fetch_basket(base_url, cookie, ids, mode)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                samples.append(round((time.perf_counter() - started) * 1000, 3))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarise(samples, errors[0], time.perf_counter() - started)
+
+def polling(base_url, cookie, mode, baskets, interval, duration, probe_id):
+    '''Terminals watch their baskets for duration seconds while a probe keeps
+    requesting one product; returns the probe's latencies and the number of
+    requests the terminals made.'''
+    stop = threading.Event()
+    polls, errors, lock = [0], [0], threading.Lock()
+
+    def terminal(ids):
+        as_of = None
+        while not stop.is_set():
+            try:
+                if mode == 'sync':
+                    fetch_basket(base_url, cookie, ids, mode)
+                    stop.wait(interval)
+                elif as_of is None:
+                    as_of = fetch_basket(base_url, cookie, ids, mode)
+                else:
+                    wait = max(1, min(30, int(duration)))
+                    as_of = get(base_url, '/api/v1/stock?' + urllib.parse.urlencode(
+                        {'ids': ','.join(map(str, ids)), 'since': as_of, 'wait': wait}), cookie)['as_of']
+            except OSError:
+                with lock:
+                    errors[0] += 1
+                stop.wait(interval)
+                continue
+            with lock:
+                polls[0] += 1
+
+    threads = [threading.Thread(target=terminal, args=(ids,), daemon=True) for ids in baskets]
+    for thread in threads:
+        thread.start()
+    time.sleep(min(2, duration / 4))  # let every terminal connect
+
+    samples, probe_errors = [], 0
+    started = time.perf_counter()
+    path = f'/api/product_stock/{probe_id}' if mode == 'sync' else f'/api/v1/stock?ids={probe_id}'
+    while time.perf_counter() - started < duration:
+        request_started = time.perf_counter()
+        try:
+            get(base_url, path, cookie)
+            samples.append(round((time.perf_counter() - request_started) * 1000, 3))
+        except OSError:
+            probe_errors += 1
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    report = summarise(samples, probe_errors, elapsed)
+    report['terminal_requests'] = polls[0]
+    report['terminal_errors'] = errors[0]
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the sync and async stock APIs under terminal-style polling.')
+    parser.add_argument('--workers', type=int, default=2, help='server processes for both gunicorn and uvicorn')
+    parser.add_argument('--batch', type=int, default=20, help='products per terminal basket')
+    parser.add_argument('--lookups', type=int, default=200, help='baskets fetched in the lookup scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads for the lookup scenario')
+    parser.add_argument('--terminals', type=int, default=100, help='polling terminals')
+    parser.add_argument('--interval', type=float, default=1.0, help='sync terminals re-fetch this often (seconds)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of polling per server')
+    parser.add_argument('--port', type=int, default=8711)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--products', type=int, default=2000, help='generate this many products if the database is empty')
+    parser.add_argument('--items', type=int, default=50000, help='... and this many line items')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ensure_bench_user()
+        if Product.query.first() is None:
+            print(f"🌱 Empty database; generating {args.products} products / {args.items} items...", file=sys.stderr)
+            generate(args.products, args.items, log=lambda message: print(message, file=sys.stderr))
+        product_ids = [row.id for row in db.session.query(Product.id).filter(~Product.is_archived)]
+        dialect = db.engine.dialect.name
+        db.engine.dispose()
+
+    rng = random.Random(args.seed)
+    batch = min(args.batch, len(product_ids))
+    lookups = [rng.sample(product_ids, batch) for _ in range(args.lookups)]
+    baskets = [rng.sample(product_ids, batch) for _ in range(args.terminals)]
+
+    report = {'meta': {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'dialect': dialect,
+        'workers': args.workers,
+        'batch': batch,
+        'terminals': args.terminals,
+        'interval_s': args.interval,
+    }}
+    for offset, mode in enumerate(['sync', 'async']):
+        print(f"🚀 {mode}: starting {args.workers} workers...", file=sys.stderr)
+        process, base_url = start_server(mode, args.port + offset, args.workers)
+        try:
+            cookie = login(base_url)
+            lookup(base_url, cookie, mode, lookups[:args.concurrency], args.concurrency)  # warm up
+            print(f"📦 {mode}: {args.lookups} basket lookups...", file=sys.stderr)
+            report[mode] = {'lookup': lookup(base_url, cookie, mode, lookups, args.concurrency)}
+            print(f"📡 {mode}: {args.terminals} terminals polling for {args.duration}s...", file=sys.stderr)
+            report[mode]['polling'] = polling(base_url, cookie, mode, baskets, args.interval,
+                                              args.duration, product_ids[0])
+        finally:
+            stop_server(process)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"✅ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
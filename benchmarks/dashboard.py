@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Dashboard KPI benchmark: per-request latency of the old per-metric queries
+against the single-row dashboard_kpis() query.
+
+Usage: python -m benchmarks.dashboard [sales] [repeats]
+Seeds a throwaway SQLite database unless DATABASE_URL is already set.
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import func, insert
+from app import create_app, db
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+from app.models.summary import DailySalesSummary
+from app.dashboard import dashboard_kpis
+from app.date_range import utc_today
+from benchmarks.datagen import reset_sequences
+
+PAYMENT_TYPES = ['Cash', 'Card', 'Bank', 'Other']
+CATEGORIES = ['Electronics', 'Clothing', 'Food', 'Home', 'Sports']
+
+def seed(sale_count, product_count=1000, batch_size=10000):
+    """Bulk insert products and single-item sales spread over the last year"""
+    now = datetime.utcnow()
+    rng = random.Random(42)
+    
+    products = []
+    for i in range(product_count):
+        cost = round(rng.uniform(1, 500), 2)
+        products.append(dict(
+            id=i + 1, name=f'Product {i + 1}', category=rng.choice(CATEGORIES),
+            cost=cost, price=round(cost * rng.uniform(1.1, 2.5), 2),
+            stock_level=rng.randint(0, 200), created_at=now, updated_at=now
+        ))
+    db.session.execute(insert(Product), products)
+    
+    for start in range(0, sale_count, batch_size):
+        sales, items = [], []
+        for sale_id in range(start + 1, min(start + batch_size, sale_count) + 1):
+            product = products[rng.randrange(product_count)]
+            quantity = rng.randint(1, 5)
+            sold_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            sales.append(dict(
+                id=sale_id, total_amount=quantity * product['price'],
+                total_cost=quantity * product['cost'], payment_type=rng.choice(PAYMENT_TYPES),
+                sale_date=sold_at, created_at=sold_at, updated_at=sold_at
+            ))
+            items.append(dict(
+                sale_id=sale_id, product_id=product['id'], quantity=quantity,
+                unit_price=product['price'], unit_cost=product['cost'],
+                product_name=product['name'], created_at=sold_at, updated_at=sold_at
+            ))
+        db.session.execute(insert(Sale), sales)
+        db.session.execute(insert(SalesItem), items)
+    db.session.commit()
+    reset_sequences(Product, Sale)
+    DailySalesSummary.rebuild()
+
+def legacy_kpis():
+    """The per-metric queries the dashboard ran before the rollup and KPI query"""
+    today = utc_today()
+    total_products = Product.query.count()
+    total_stock_value = db.session.query(func.sum(Product.price * Product.stock_level)).scalar() or 0
+    low_stock_count = Product.query.filter(Product.stock_level <= 10).count()
+    today_revenue = db.session.query(func.sum(Sale.total_amount)).filter(
+        func.date(Sale.created_at) == today).scalar() or 0
+    today_cost = db.session.query(func.sum(Sale.total_cost)).filter(
+        func.date(Sale.created_at) == today).scalar() or 0
+    month_profit = db.session.query(func.sum(Sale.total_amount - Sale.total_cost)).filter(
+        func.date(Sale.sale_date) >= today.replace(day=1)).scalar() or 0
+    return total_products, total_stock_value, low_stock_count, today_revenue, today_cost, month_profit
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+    samples.sort()
+    return samples[len(samples) // 2], samples[-1]
+
+def main():
+    sale_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if Sale.query.count() == 0:
+            print(f"🌱 Seeding {sale_count} sales...")
+            seed(sale_count)
+        
+        print(f"⏱️  Dashboard KPIs over {Sale.query.count()} sales ({repeats} runs)")
+        for label, fn in [('before (per-metric queries)', legacy_kpis),
+                          ('after  (dashboard_kpis)', dashboard_kpis)]:
+            median, worst = timed(fn, repeats)
+            print(f"   {label}: median {median:.2f} ms, max {worst:.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for benchmarks: products plus a sales history
+with realistic shape, written with bulk executemany inserts.
+
+* Product popularity is long-tailed (a few best-sellers, many slow movers).
+* Sales follow a yearly season (December peak, February trough), busier
+  weekends, a lunchtime and evening peak within the day, and mild growth.
+* Baskets hold 1-6 lines, most of them small.
+
+Generation is streamed day by day in chronological order, so ids grow with
+sale_date like they do in production and memory stays bounded by the batch
+size even for tens of millions of line items. Output is deterministic for
+a given seed.
+
+Usage: python -m benchmarks.datagen [--products N] [--items N] [--days N] [--seed N]
+Uses a throwaway SQLite database unless DATABASE_URL is already set.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from itertools import accumulate
+from sqlalchemy import insert, text
+from app import create_app, db
+from app.models.user import User
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+from app.models.summary import DailySalesSummary
+from app.stock_alerts import check_thresholds
+from app.stock_ledger import open_ledger
+
+BENCH_USER = ('bench', 'bench')
+BATCH_SIZE = 20000
+
+# category: (share of catalogue, typical price)
+CATEGORIES = {
+    'Electronics': (0.15, 180.0),
+    'Clothing': (0.25, 35.0),
+    'Food': (0.30, 6.0),
+    'Home': (0.20, 45.0),
+    'Sports': (0.10, 60.0),
+}
+PAYMENT_TYPES = ['Cash', 'Card', 'Bank', 'Other']
+PAYMENT_WEIGHTS = [0.35, 0.45, 0.15, 0.05]
+BASKET_SIZE_WEIGHTS = [0.45, 0.25, 0.14, 0.08, 0.05, 0.03]  # 1..6 lines
+ADJECTIVES = ['Classic', 'Premium', 'Compact', 'Organic', 'Deluxe', 'Eco', 'Smart', 'Mini', 'Pro', 'Fresh']
+NOUNS = ['Kit', 'Pack', 'Set', 'Box', 'Bundle', 'Edition', 'Model', 'Series', 'Line', 'Select']
+# Relative traffic by hour of day (UTC)
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.2, 0.2, 0.4, 1, 2, 3, 4, 5, 7, 9, 8, 6, 5, 5, 6, 8, 9, 7, 5, 3, 2]
+
+def day_weight(day, first_day, last_day):
+    '''Relative number of sales on a day: season x weekday x growth'''
+    season = 1 + 0.35 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 355) / 365.25)
+    weekday = 1.4 if day.weekday() >= 5 else 1.0
+    span = max((last_day - first_day).days, 1)
+    growth = 1 + 0.3 * (day - first_day).days / span
+    return season * weekday * growth
+
+def product_rows(count, rng, created_at):
+    names = list(CATEGORIES)
+    shares = [share for share, _ in CATEGORIES.values()]
+    for product_id in range(1, count + 1):
+        category = rng.choices(names, shares)[0]
+        price = round(CATEGORIES[category][1] * rng.lognormvariate(0, 0.5), 2) or 0.5
+        stock = rng.randint(0, 12) if rng.random() < 0.1 else rng.randint(13, 500)
+        yield dict(
+            id=product_id,
+            name=f'{rng.choice(ADJECTIVES)} {category} {rng.choice(NOUNS)} {product_id}',
+            category=category,
+            cost=round(price * rng.uniform(0.4, 0.8), 2),
+            price=price,
+            stock_level=stock,
+            description=f'Synthetic {category.lower()} product for benchmarks',
+            created_at=created_at,
+            updated_at=created_at,
+        )
+
+def reset_sequences(*models):
+    '''Move the Postgres id sequences past ids inserted explicitly, so rows
+    the app inserts afterwards do not collide with them'''
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) "
+            f"FROM {table}"))
+    db.session.commit()
+
+def _flush(sales, items):
+    if sales:
+        db.session.execute(insert(Sale), sales)
+        db.session.execute(insert(SalesItem), items)
+        db.session.commit()
+        sales.clear()
+        items.clear()
+
+def generate(products=10000, items=1000000, days=365, seed=42, batch_size=BATCH_SIZE, log=print):
+    '''Fill an empty database; returns {'products', 'sales', 'items'} written'''
+    rng = random.Random(seed)
+    last_day = datetime.utcnow().date()
+    first_day = last_day - timedelta(days=days - 1)
+    started = time.perf_counter()
+
+    # Products, in batches so a million of them never sit in memory at once
+    catalogue_created = datetime.combine(first_day, datetime.min.time()) - timedelta(days=30)
+    catalogue = product_rows(products, rng, catalogue_created)
+    written = 0
+    while True:
+        batch = [row for _, row in zip(range(batch_size), catalogue)]
+        if not batch:
+            break
+        db.session.execute(insert(Product), batch)
+        db.session.commit()
+        written += len(batch)
+    check_thresholds(queue_alerts=False)
+    db.session.commit()
+    open_ledger()
+    log(f"   {written} products in {time.perf_counter() - started:.1f}s")
+
+    # Prices are needed per line; keep just (price, cost, name) per product
+    prices = [None] + [(row.price, row.cost, row.name) for row in db.session.query(
+        Product.price, Product.cost, Product.name).order_by(Product.id)]
+
+    # Long-tailed popularity: weight ~ 1 / rank^1.1, ranks shuffled over ids
+    ranks = list(range(1, products + 1))
+    rng.shuffle(ranks)
+    popularity = list(accumulate(1 / rank ** 1.1 for rank in ranks))
+    product_ids = range(1, products + 1)
+
+    mean_basket = sum((size + 1) * weight for size, weight in enumerate(BASKET_SIZE_WEIGHTS))
+    sale_total = max(1, round(items / mean_basket))
+    calendar = [first_day + timedelta(days=offset) for offset in range(days)]
+    weights = [day_weight(day, first_day, last_day) for day in calendar]
+    weight_sum = sum(weights)
+    hour_cum = list(accumulate(HOUR_WEIGHTS))
+    now = datetime.utcnow()
+
+    sales, lines = [], []
+    sale_id = item_count = 0
+    carry = 0.0
+    for day, weight in zip(calendar, weights):
+        carry += sale_total * weight / weight_sum
+        todays = int(carry)
+        carry -= todays
+        midnight = datetime.combine(day, datetime.min.time())
+        moments = sorted(
+            midnight + timedelta(hours=hour, seconds=rng.randrange(3600))
+            for hour in rng.choices(range(24), cum_weights=hour_cum, k=todays)
+        )
+        for sold_at in moments:
+            if sold_at > now:
+                sold_at = now
+            sale_id += 1
+            basket = set(rng.choices(product_ids, cum_weights=popularity,
+                                     k=rng.choices(range(1, 7), BASKET_SIZE_WEIGHTS)[0]))
+            amount = cost = 0.0
+            for product_id in basket:
+                price, unit_cost, name = prices[product_id]
+                quantity = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+                amount += price * quantity
+                cost += unit_cost * quantity
+                lines.append(dict(
+                    sale_id=sale_id, product_id=product_id, quantity=quantity,
+                    unit_price=price, unit_cost=unit_cost, product_name=name,
+                    created_at=sold_at, updated_at=sold_at
+                ))
+            item_count += len(basket)
+            sales.append(dict(
+                id=sale_id, total_amount=round(amount, 2), total_cost=round(cost, 2),
+                payment_type=rng.choices(PAYMENT_TYPES, PAYMENT_WEIGHTS)[0],
+                sale_date=sold_at, created_at=sold_at, updated_at=sold_at
+            ))
+            if len(lines) >= batch_size:
+                _flush(sales, lines)
+        if day.day == 1:
+            log(f"   ... {day:%Y-%m}: {sale_id} sales, {item_count} items "
+                f"({time.perf_counter() - started:.0f}s)")
+    _flush(sales, lines)
+    reset_sequences(Product, Sale)
+    log(f"   {sale_id} sales / {item_count} items in {time.perf_counter() - started:.1f}s")
+
+    rollup_rows = DailySalesSummary.rebuild()
+    log(f"   rollup rebuilt: {rollup_rows} rows")
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    return {'products': products, 'sales': sale_id, 'items': item_count}
+
+def ensure_bench_user():
+    '''Login used by the load generator'''
+    username, password = BENCH_USER
+    if not User.query.filter_by(username=username).first():
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password(password)
+        user.save()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic benchmark dataset.')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=1000000, help='sales line items to generate')
+    parser.add_argument('--days', type=int, default=365, help='length of the sales history')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ensure_bench_user()
+        if Product.query.first() is not None or Sale.query.first() is not None:
+            print("❌ The database already has products or sales; point DATABASE_URL at an empty one")
+            return 1
+        print(f"🌱 Generating {args.products} products and ~{args.items} line items over {args.days} days...")
+        counts = generate(args.products, args.items, args.days, args.seed, args.batch_size)
+        print(f"✅ Done: {counts}")
+        print(f"   DATABASE_URL={db.engine.url.render_as_string(hide_password=True)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
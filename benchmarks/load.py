@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Load generator: drives a weighted mix of pages, APIs and sales against the
+app and reports per-route latency percentiles and throughput as JSON, so
+runs can be compared between versions.
+
+By default requests go through the Flask test client in-process (no
+network, no server needed). With --url they are sent over HTTP to a
+running server instead, e.g. gunicorn with several workers.
+
+Usage:
+    python -m benchmarks.datagen --products 10000 --items 1000000
+    python -m benchmarks.load --requests 2000 --concurrency 8 --output run.json
+    python -m benchmarks.load --duration 60 --baseline run.json
+
+The same DATABASE_URL must be used for both steps (datagen falls back to a
+throwaway SQLite file, so set it explicitly). With --baseline the run is
+compared against an earlier report and exits non-zero when any route's p95
+regressed by more than --tolerance.
+"""
+import argparse
+import http.cookiejar
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from app import create_app, db
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+from benchmarks.datagen import BENCH_USER, ensure_bench_user, generate
+
+SEARCH_TERMS = ['pro', 'kit', 'organic', 'smart box', 'deluxe', 'fresh', 'mini pack', 'select']
+SORTS = ['created_at', 'name', 'price', 'stock', 'category', 'sold', 'revenue']
+
+def scenarios(product_ids, today):
+    '''(name, weight, build) where build(rng) returns (method, path, body); the
+    body is None, form data, or a JSONBody'''
+    def report(rng):
+        days = rng.choice([7, 30, 90, 365])
+        end = today - timedelta(days=rng.choice([0, 0, 0, 30]))
+        return 'GET', f'/reports?date_from={end - timedelta(days=days)}&date_to={end}', None
+
+    def inventory(rng):
+        params = {'sort_by': rng.choice(SORTS), 'sort_order': rng.choice(['asc', 'desc'])}
+        if rng.random() < 0.3:
+            params['search'] = rng.choice(SEARCH_TERMS)
+        return 'GET', '/inventory?' + urllib.parse.urlencode(params), None
+
+    def record_sale(rng):
+        # The API answers 201 only when the sale was written, unlike the form
+        # route, whose redirect looks the same whether it worked or not
+        basket = rng.sample(product_ids, min(len(product_ids), rng.randint(1, 3)))
+        return 'POST', '/api/checkout', JSONBody(
+            items=[{'product_id': product_id, 'quantity': 1} for product_id in basket],
+            payment_type=rng.choice(['Cash', 'Card']),
+        )
+
+    return [
+        ('dashboard', 20, lambda rng: ('GET', '/dashboard', None)),
+        ('api_dashboard_data', 15, lambda rng: ('GET', '/api/dashboard_data', None)),
+        ('inventory', 15, inventory),
+        ('reports', 10, report),
+        ('record_sale', 10, record_sale),
+        ('api_products', 10, lambda rng: ('GET', f'/api/products?sort_by={rng.choice(SORTS)}', None)),
+        ('api_product_search', 10, lambda rng: ('GET', '/api/products/search?' + urllib.parse.urlencode(
+            {'q': rng.choice(SEARCH_TERMS)}), None)),
+        ('api_product_stock', 10, lambda rng: ('GET', f'/api/product_stock/{rng.choice(product_ids)}', None)),
+        ('api_product_stock_batch', 5, lambda rng: ('GET', '/api/product_stock?ids=' + ','.join(
+            map(str, rng.sample(product_ids, min(len(product_ids), 200)))), None)),
+    ]
+
+# ============================================================================
+# Clients
+# ============================================================================
+
+class JSONBody(dict):
+    '''Request body sent as application/json instead of form data'''
+
+class TestClient:
+    '''In-process client around app.test_client()'''
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        username, password = BENCH_USER
+        self.client.post('/login', data={'username': username, 'password': password})
+
+    def request(self, method, path, data):
+        if isinstance(data, JSONBody):
+            response = self.client.open(path, method=method, json=data)
+        else:
+            response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code
+
+class HttpClient:
+    '''Client for a running server; keeps the session cookie from /login'''
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        username, password = BENCH_USER
+        self.request('POST', '/login', {'username': username, 'password': password})
+
+    def request(self, method, path, data):
+        headers = {}
+        if isinstance(data, JSONBody):
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time the request itself; the worker then treats any redirect as an error
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+# ============================================================================
+# Run
+# ============================================================================
+
+def percentile(sorted_samples, pct):
+    '''Nearest-rank percentile of an already sorted list'''
+    if not sorted_samples:
+        return None
+    rank = max(1, -(-len(sorted_samples) * pct // 100))
+    return sorted_samples[int(rank) - 1]
+
+def summarise(samples, errors, elapsed, conflicts=0):
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        'count': count,
+        'errors': errors,
+        'conflicts': conflicts,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(samples) / count, 3) if count else None,
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'max_ms': samples[-1] if samples else None,
+    }
+
+def worker(make_client, mix, jobs, deadline, seed, results, lock):
+    rng = random.Random(seed)
+    client = make_client()
+    names, weights, builders = zip(*mix)
+    local = {name: ([], 0, 0) for name in names}
+    while time.perf_counter() < deadline:
+        with lock:
+            if jobs[0] <= 0:
+                break
+            jobs[0] -= 1
+        index = rng.choices(range(len(names)), weights)[0]
+        method, path, data = builders[index](rng)
+        started = time.perf_counter()
+        try:
+            status = client.request(method, path, data)
+        except Exception:
+            status = None
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        samples, errors, conflicts = local[names[index]]
+        samples.append(elapsed_ms)
+        # Only a 2xx is a success: a redirect here means the session was lost.
+        # 409 is a sale refused for lack of stock, counted on its own
+        if status == 409:
+            local[names[index]] = (samples, errors, conflicts + 1)
+        elif status is None or not 200 <= status < 300:
+            local[names[index]] = (samples, errors + 1, conflicts)
+    with lock:
+        for name, (samples, errors, conflicts) in local.items():
+            results[name][0].extend(samples)
+            results[name][1] += errors
+            results[name][2] += conflicts
+
+def run(make_client, mix, total_requests, duration, concurrency, seed):
+    results = {name: [[], 0, 0] for name, _, _ in mix}
+    jobs = [total_requests if total_requests else float('inf')]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration if duration else float('inf')
+    threads = [threading.Thread(target=worker, args=(make_client, mix, jobs, deadline, seed + i, results, lock))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    all_samples = [sample for samples, _, _ in results.values() for sample in samples]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'overall': summarise(all_samples, sum(errors for _, errors, _ in results.values()), elapsed,
+                             sum(conflicts for _, _, conflicts in results.values())),
+        'routes': {name: summarise(samples, errors, elapsed, conflicts)
+                   for name, (samples, errors, conflicts) in results.items()},
+    }
+
+def compare(report, baseline, tolerance):
+    '''Print p95 changes against a baseline report; return True if none regressed'''
+    ok = True
+    for name, stats in report['routes'].items():
+        before = baseline.get('routes', {}).get(name, {}).get('p95_ms')
+        after = stats['p95_ms']
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"   {'❌' if regressed else '✅'} {name}: p95 {before:.1f} → {after:.1f} ms ({change:+.0%})",
+              file=sys.stderr)
+    return ok
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive the app and report latency percentiles as JSON.')
+    parser.add_argument('--url', help='base URL of a running server; default is the in-process test client')
+    parser.add_argument('--requests', type=int, default=1000, help='total requests (0 = until --duration)')
+    parser.add_argument('--duration', type=float, default=0, help='stop after this many seconds')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=50, help='requests sent before measuring')
+    parser.add_argument('--no-writes', action='store_true', help='leave out record_sale')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--products', type=int, default=2000, help='generate this many products if the database is empty')
+    parser.add_argument('--items', type=int, default=100000, help='... and this many line items')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON report to compare p95 against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 regression (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    if not args.requests and not args.duration:
+        parser.error('give --requests or --duration')
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ensure_bench_user()
+        if Product.query.first() is None:
+            print(f"🌱 Empty database; generating {args.products} products / {args.items} items...", file=sys.stderr)
+            generate(args.products, args.items, log=lambda message: print(message, file=sys.stderr))
+        product_ids = [row.id for row in db.session.query(Product.id).filter(
+            ~Product.is_archived, Product.stock_level > 0)]
+        dataset = {
+            'dialect': db.engine.dialect.name,
+            'products': db.session.query(func.count(Product.id)).scalar(),
+            'sales': db.session.query(func.count(Sale.id)).scalar(),
+            'sales_items': db.session.query(func.count(SalesItem.id)).scalar(),
+        }
+        today = datetime.utcnow().date()
+
+    mix = [scenario for scenario in scenarios(product_ids, today)
+           if not (args.no_writes and scenario[0] == 'record_sale')]
+    make_client = (lambda: HttpClient(args.url)) if args.url else (lambda: TestClient(app))
+
+    print(f"🔥 {args.requests or 'unbounded'} requests{f' / {args.duration}s' if args.duration else ''} "
+          f"from {args.concurrency} workers against {args.url or 'the test client'}...", file=sys.stderr)
+    if args.warmup:
+        run(make_client, mix, args.warmup, 0, min(args.concurrency, args.warmup), args.seed + 1000)
+    report = run(make_client, mix, args.requests, args.duration, args.concurrency, args.seed)
+    report = dict({
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'revision': git_revision(),
+            'target': args.url or 'test_client',
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'dataset': dataset,
+        }
+    }, **report)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"✅ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 0 if compare(report, baseline, args.tolerance) else 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress check for the sale path: many threads post record_sale
+for the same few hot SKUs at once, then the final stock is reconciled
+against what was actually sold.
+
+Usage: python -m benchmarks.stock_race [sales] [threads] [stock_per_product]
+Uses a throwaway SQLite database unless DATABASE_URL is already set (point
+it at a scratch Postgres database to exercise real row locking).
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'race.db')
+
+from sqlalchemy import func
+from app import create_app, db
+from app.models.user import User
+from app.models.products import Product
+from app.models.sales import SalesItem
+
+HOT_PRODUCTS = 3
+
+def setup(app, stock):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='stress', email='stress@example.com')
+        user.set_password('stress')
+        db.session.add(user)
+        for i in range(HOT_PRODUCTS):
+            db.session.add(Product(name=f'Hot SKU {i + 1}', category='Stress',
+                                   cost=1.0, price=2.0, stock_level=stock))
+        db.session.commit()
+        return [product.id for product in Product.query.order_by(Product.id)]
+
+def worker(app, product_ids, jobs, results):
+    client = app.test_client()
+    client.post('/login', data={'username': 'stress', 'password': 'stress'})
+    while True:
+        try:
+            index = jobs.pop()
+        except IndexError:
+            return
+        response = client.post('/record_sale', data={
+            'product_id': str(product_ids[index % len(product_ids)]),
+            'quantity': '1',
+            'payment_type': 'Cash'
+        })
+        results[response.status_code] += 1
+
+def main():
+    sales = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    stock = int(sys.argv[3]) if len(sys.argv) > 3 else sales // (2 * HOT_PRODUCTS)
+    
+    app = create_app()
+    product_ids = setup(app, stock)
+    jobs = list(range(sales))
+    results = Counter()
+    
+    print(f"🔥 {sales} concurrent record_sale calls on {HOT_PRODUCTS} SKUs "
+          f"({stock} units each) from {threads} threads...")
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(app, product_ids, jobs, results)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    with app.app_context():
+        sold = dict(db.session.query(SalesItem.product_id, func.sum(SalesItem.quantity))
+                    .group_by(SalesItem.product_id).all())
+        ok = True
+        for product in Product.query.order_by(Product.id):
+            units_sold = sold.get(product.id, 0)
+            consistent = product.stock_level == stock - units_sold and product.stock_level >= 0
+            ok = ok and consistent
+            print(f"   {'✅' if consistent else '❌'} {product.name}: sold {units_sold}, "
+                  f"stock {product.stock_level} (expected {stock - units_sold})")
+    
+    print(f"⏱️  {sales} requests in {elapsed:.1f}s, responses: {dict(results)}")
+    print("🎉 Stock matches sales" if ok else "❌ Stock does not match sales")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
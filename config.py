@@ -1,8 +1,54 @@
 import os
 from datetime import timedelta
+from sqlalchemy.pool import NullPool
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+def _flag(name, default=''):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+def engine_options(database_url):
+    """SQLAlchemy engine/pool settings, tunable through DB_* environment variables.
+
+    Each server worker process (uvicorn --workers) gets its own pool, so the
+    most connections one deployment can open is
+    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+    DB_PGBOUNCER=1 switches to NullPool: PgBouncer does the pooling and
+    every checkout opens a fresh (cheap) connection to it.
+    """
+    if (database_url or '').startswith('sqlite'):
+        return {'pool_pre_ping': True}
+    
+    if _flag('DB_PGBOUNCER'):
+        # Transaction-mode PgBouncer rejects startup options, so set
+        # statement_timeout on the database role instead
+        return {'poolclass': NullPool}
+    
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Hosted Postgres drops idle connections; recycle before that and
+        # ping on checkout so a dead connection is replaced, not raised
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+def replica_binds(replica_url):
+    """Flask-SQLAlchemy binds for an optional read replica (see app/db_routing.py)"""
+    if not replica_url:
+        return {}
+    options = engine_options(replica_url)
+    if replica_url.startswith('postgres') and 'poolclass' not in options:
+        # Fail fast if anything ever tries to write through the replica bind
+        connect_args = options.setdefault('connect_args', {})
+        connect_args['options'] = (connect_args.get('options', '') + ' -c default_transaction_read_only=on').strip()
+    return {'replica': dict(options, url=replica_url)}
+
 class Config:
     # Basic Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY', 'ante1213$')
@@ -10,13 +56,36 @@ class Config:
     # Database configuration - Railway provides DATABASE_URL
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    
+    # Optional read replica for reports, dashboard and listing reads; clients
+    # that just wrote read from the primary for REPLICA_STICKY_SECONDS
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('DATABASE_REPLICA_URL'))
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     
     # Application settings
     ITEMS_PER_PAGE = 50
-    LOW_STOCK_THRESHOLD = 10
+    # Default reorder point for products without their own; after changing
+    # it run recheck_low_stock.py to re-flag existing products
+    LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD', 10))
+    
+    # Instrumentation (opt-in): /metrics, Server-Timing and X-Query-Count
+    INSTRUMENTATION_ENABLED = _flag('INSTRUMENTATION_ENABLED')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    QUERY_COUNT_HEADER = _flag('QUERY_COUNT_HEADER')
+    
+    # Aggregate cache: in-process LRU, or shared when CACHE_URL is a redis:// URL.
+    # The in-process cache is only used with a single web worker process
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+    CACHE_ENABLED = _flag('CACHE_ENABLED', '1')
+    CACHE_URL = os.environ.get('CACHE_URL')
+    CACHE_MAX_ENTRIES = 512
+    CACHE_TODAY_TTL = 300  # seconds; today's entries are also invalidated on write
+    CACHE_PAST_TTL = 3600  # seconds; bounds staleness after history is rewritten by another process
+    CACHE_PAGE_TTL = 3600  # seconds; rendered pages are keyed by their ETag
 
 class DevelopmentConfig(Config):
     DEBUG = True
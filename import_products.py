@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Bulk import products or a stock-take from a CSV (or .xlsx) file
+"""
+import sys
+import time
+from app import create_app, db
+from app.importer import import_products, read_rows, ImportFileError, CHUNK_SIZE
+from app.cache import is_shared
+
+def run_import(path, chunk_size=CHUNK_SIZE):
+    """Stream the file into the products table and print a summary"""
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        print(f"📥 Importing {path} in chunks of {chunk_size}...")
+        started = time.perf_counter()
+        
+        try:
+            with open(path, 'rb') as stream:
+                result = import_products(read_rows(stream, path), chunk_size)
+        except (OSError, ImportFileError) as e:
+            print(f"❌ Import failed: {e}")
+            return False
+        
+        elapsed = time.perf_counter() - started
+        print(f"✅ {result.rows} rows in {elapsed:.1f}s: "
+              f"{result.created} created, {result.updated} updated, {result.failed} failed")
+        for error in result.errors:
+            print(f"   ⚠️  line {error['line']}: {error['error']}")
+        if result.failed > len(result.errors):
+            print(f"   ... and {result.failed - len(result.errors)} more errors")
+        if (result.created or result.updated) and not is_shared():
+            print(f"ℹ️  No shared cache: running web servers show renamed products in past reports "
+                  f"within {app.config['CACHE_PAST_TTL']}s")
+        return result.failed == 0
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] in ('help', '-h', '--help'):
+        print("Usage: python import_products.py FILE.csv [chunk_size]")
+        print()
+        print("Columns: id or name, plus any of category, cost, price, stock_level, description")
+        sys.exit(0 if len(sys.argv) > 1 else 1)
+    
+    chunk = int(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_SIZE
+    sys.exit(0 if run_import(sys.argv[1], chunk) else 1)
@@ -6,6 +6,9 @@ from app import create_app, db
 from app.models.user import User
 from app.models.products import Product
 from app.models.sales import Sale, SalesItem
+from app.models.summary import DailySalesSummary
+from app.stock_alerts import check_thresholds
+from app.stock_ledger import open_ledger
 
 def check_database_lock():
     """Check if database is locked and wait if necessary"""
@@ -293,6 +296,12 @@ def populate_database(reset=False):
             sales = create_sample_sales()
             print(f"   Created {len(sales)} sales transactions")
             
+            # Bring the reporting rollup and low-stock flags in line with the sample sales
+            DailySalesSummary.rebuild()
+            check_thresholds(queue_alerts=False)
+            db.session.commit()
+            open_ledger()
+            
             print("\n" + "=" * 60)
             print("🎉 DATABASE POPULATION COMPLETED SUCCESSFULLY!")
             print("=" * 60)
@@ -348,7 +357,7 @@ def show_database_info():
         print(f"💵 Total Revenue: ${total_revenue:.2f}")
         
         # Low stock products
-        low_stock = Product.query.filter(Product.stock_level <= 10).count()
+        low_stock = Product.query.filter(Product.low_stock).count()
         if low_stock > 0:
             print(f"⚠️  Low stock alerts: {low_stock} products")
         
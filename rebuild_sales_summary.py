@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Backfill / rebuild the daily_sales_summary rollup from raw sales
+"""
+import sys
+from datetime import datetime
+from app import create_app, db
+from app.models.summary import DailySalesSummary
+from app.cache import invalidate_all, is_shared
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def rebuild_summary(start_date=None, end_date=None):
+    """Rebuild the rollup for the given inclusive date range (all days if omitted)"""
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        
+        scope = 'all days'
+        if start_date or end_date:
+            scope = f"{start_date or 'beginning'} → {end_date or 'today'}"
+        print(f"🔄 Rebuilding daily sales summary ({scope})...")
+        
+        try:
+            rows = DailySalesSummary.rebuild(start_date, end_date)
+            invalidate_all()
+            print(f"✅ Daily sales summary rebuilt: {rows} rows written")
+            if not is_shared():
+                print(f"ℹ️  No shared cache: running web servers show the new figures within "
+                      f"{app.config['CACHE_PAST_TTL']}s")
+            return True
+        except Exception as e:
+            print(f"❌ Rebuild failed: {e}")
+            return False
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in ('help', '-h', '--help'):
+        print("Usage: python rebuild_sales_summary.py [YYYY-MM-DD] [YYYY-MM-DD]")
+        print()
+        print("  (no args)         - Rebuild the summary for every day")
+        print("  start [end]       - Rebuild only the inclusive date range")
+        sys.exit(0)
+    
+    try:
+        start = parse_date(sys.argv[1]) if len(sys.argv) > 1 else None
+        end = parse_date(sys.argv[2]) if len(sys.argv) > 2 else None
+    except ValueError:
+        print("❌ Dates must be in YYYY-MM-DD format")
+        sys.exit(1)
+    
+    sys.exit(0 if rebuild_summary(start, end) else 1)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Create or rebuild the product full-text search index on an existing database
+"""
+import sys
+from app import create_app, db
+from app.search import setup_search_index
+
+def rebuild_search_index():
+    """Create the search index if missing and refill it from products"""
+    app = create_app()
+    
+    with app.app_context():
+        print("🔄 Setting up product search index...")
+        
+        try:
+            backend = setup_search_index()
+            if backend == 'like':
+                print("⚠️  No full-text index available for this database; search falls back to LIKE")
+            else:
+                print(f"✅ Product search index ready ({backend})")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Search index setup failed: {e}")
+            return False
+
+if __name__ == '__main__':
+    sys.exit(0 if rebuild_search_index() else 1)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Set up low-stock alerting on an existing database and re-flag products.
+
+Adds products.reorder_threshold / products.low_stock, the partial low-stock
+index and the stock_alerts table when they are missing, then recomputes
+every product's low-stock flag. Run it again after changing
+LOW_STOCK_THRESHOLD; re-flagging does not queue alerts.
+"""
+import sys
+from app import create_app, db
+from app.stock_alerts import check_thresholds
+from sqlalchemy import inspect, text
+
+def add_columns():
+    columns = {column['name'] for column in inspect(db.engine).get_columns('products')}
+    false = 'false' if db.engine.dialect.name == 'postgresql' else '0'
+    if 'reorder_threshold' not in columns:
+        print("🔄 Adding products.reorder_threshold...")
+        db.session.execute(text("ALTER TABLE products ADD COLUMN reorder_threshold INTEGER"))
+    if 'low_stock' not in columns:
+        print("🔄 Adding products.low_stock...")
+        db.session.execute(text(f"ALTER TABLE products ADD COLUMN low_stock BOOLEAN NOT NULL DEFAULT {false}"))
+    predicate = 'low_stock' if db.engine.dialect.name == 'postgresql' else 'low_stock = 1'
+    db.session.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_products_low_stock ON products (stock_level, id) WHERE {predicate}"))
+    db.session.commit()
+
+def recheck_low_stock():
+    """Add the low-stock schema if needed and recompute every product's flag"""
+    app = create_app()
+
+    with app.app_context():
+        try:
+            add_columns()
+            # Creates stock_alerts (and its index) if it does not exist yet
+            db.create_all()
+            check_thresholds(queue_alerts=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Low-stock setup failed: {e}")
+            return False
+
+        low = db.session.execute(text("SELECT count(*) FROM products WHERE low_stock")).scalar()
+        print(f"✅ Low-stock flags recomputed (default threshold "
+              f"{app.config['LOW_STOCK_THRESHOLD']}): {low} product(s) low")
+        return True
+
+if __name__ == '__main__':
+    sys.exit(0 if recheck_low_stock() else 1)
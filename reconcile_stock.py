@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Check every product's stock_level against the stock movement ledger.
+
+Exits non-zero when they disagree. With --fix each difference is booked as
+an 'adjustment' movement so the ledger matches the shelf count again.
+Best run when sales are quiet; mismatches are re-checked under a row lock
+before being fixed.
+"""
+import argparse
+import sys
+from app import create_app
+from app.stock_ledger import reconcile
+
+def reconcile_stock(fix=False, show=20):
+    """Report (and optionally fix) products whose stock disagrees with the ledger"""
+    app = create_app()
+
+    with app.app_context():
+        mismatches = reconcile(fix=fix)
+        if not mismatches:
+            print("✅ Stock levels match the ledger")
+            return True
+
+        print(f"{'🔧' if fix else '⚠️ '} {len(mismatches)} product(s) disagree with the ledger:")
+        for row in mismatches[:show]:
+            print(f"   #{row.id} {row.name}: stock_level {row.stock_level}, ledger {row.ledger_level} "
+                  f"({row.stock_level - row.ledger_level:+d})")
+        if len(mismatches) > show:
+            print(f"   ... and {len(mismatches) - show} more")
+        if fix:
+            print("✅ Adjustments booked; the ledger now matches stock_level")
+        return fix
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconcile stock levels with the movement ledger.')
+    parser.add_argument('--fix', action='store_true', help='book an adjustment for every difference')
+    args = parser.parse_args()
+    sys.exit(0 if reconcile_stock(args.fix) else 1)
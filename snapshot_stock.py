@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Checkpoint the stock ledger so point-in-time queries stay cheap.
+
+Run once a day shortly after midnight (UTC), e.g. from cron:
+    5 0 * * *  python snapshot_stock.py
+The first run also starts the ledger, recording every product's current
+stock as an opening balance. Use --at to snapshot another moment.
+"""
+import argparse
+import sys
+from datetime import datetime
+from app import create_app, db
+from app.date_range import utc_today
+from app.stock_ledger import open_ledger, take_snapshot
+
+def snapshot_stock(at=None):
+    """Open the ledger where needed and snapshot it at `at` (default: last midnight)"""
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        try:
+            opened = open_ledger()
+            if opened:
+                print(f"📒 Opening balances recorded for {opened} product(s)")
+            taken_at = at or datetime.combine(utc_today(), datetime.min.time())
+            rows = take_snapshot(taken_at)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Snapshot failed: {e}")
+            return False
+
+        if rows is None:
+            print(f"✅ Snapshot at {taken_at} already exists")
+        else:
+            print(f"✅ Snapshot at {taken_at}: {rows} product balance(s)")
+        return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Snapshot the stock movement ledger.')
+    parser.add_argument('--at', type=datetime.fromisoformat, help='moment to snapshot (UTC, ISO format)')
+    args = parser.parse_args()
+    sys.exit(0 if snapshot_stock(args.at) else 1)
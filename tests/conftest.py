@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+# Config is read from the environment at import time, so point it at a
+# throwaway SQLite database before anything imports the app
+_workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'test.db')
+os.environ.pop('DATABASE_REPLICA_URL', None)
+os.environ.pop('CACHE_URL', None)
+os.environ['QUERY_COUNT_HEADER'] = '1'
+
+import pytest
+from app import create_app, db
+from app.models.user import User
+from app.models.products import Product
+
+USERNAME, PASSWORD = 'tester', 'tester'
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        user = User(username=USERNAME, email='tester@example.com')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        for i in range(20):
+            db.session.add(Product(name=f'Product {i + 1}', category=f'Category {i % 3}',
+                                   cost=1.0, price=2.0 + i, stock_level=500))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+@pytest.fixture
+def login_form():
+    return {'username': USERNAME, 'password': PASSWORD}
+
+@pytest.fixture
+def client(app, login_form):
+    client = app.test_client()
+    client.post('/login', data=login_form)
+    return client
+
+@pytest.fixture
+def record_sales(client):
+    '''record_sales(n) sells n single-item baskets through /record_sale'''
+    def record(count):
+        for i in range(count):
+            response = client.post('/record_sale', data={'product_id': str(i % 20 + 1), 'quantity': '1',
+                                                         'payment_type': 'Cash'})
+            assert response.status_code == 302
+    return record
@@ -0,0 +1,42 @@
+'''The ASGI entry point (async API + Flask) must boot in every supported configuration'''
+import time
+from starlette.testclient import TestClient
+from config import replica_binds
+from app import instrumentation
+from app.async_api import create_asgi_app
+
+def test_asgi_app_starts_with_instrumented_pool(app, login_form):
+    # What configure_engine() leaves in the config on Postgres with INSTRUMENTATION_ENABLED
+    app.config['INSTRUMENTATION_ENABLED'] = True
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                                   pool_size=5, max_overflow=10)
+    instrumentation.configure_engine(app)
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] is instrumentation.TimedQueuePool
+
+    with TestClient(create_asgi_app(app, wsgi_threads=2)) as client:
+        client.post('/login', data=login_form)
+        response = client.get('/api/v1/stock?ids=1,2')
+        assert response.status_code == 200
+        assert [product['product_id'] for product in response.json()['products']] == [1, 2]
+
+def test_async_sale_rejects_malformed_basket(app, login_form):
+    with TestClient(create_asgi_app(app, wsgi_threads=2)) as client:
+        client.post('/login', data=login_form)
+        for body in ([], {'items': [1]}, {'items': [{'product_id': 1}]}):
+            assert client.post('/api/v1/sales', json=body).status_code == 400
+        assert client.post('/api/v1/sales', json={'items': [{'product_id': 1, 'quantity': 1}]}).status_code == 201
+
+def test_async_sale_pins_client_to_primary(app, login_form):
+    # The replica is the same database here; only the routing matters
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config['SQLALCHEMY_DATABASE_URI'])
+    with TestClient(create_asgi_app(app, wsgi_threads=2)) as client:
+        client.post('/login', data=login_form)
+        response = client.post('/api/v1/sales', json={'items': [{'product_id': 1, 'quantity': 1}]})
+        assert response.status_code == 201
+
+        serializer = app.session_interface.get_signing_serializer(app)
+        session = serializer.loads(client.cookies[app.config['SESSION_COOKIE_NAME']])
+        assert session['primary_until'] > time.time()
+        assert 'user_id' in session
+        # The rewritten cookie still logs the client in
+        assert client.get('/api/v1/sales').status_code == 200
@@ -0,0 +1,25 @@
+'''Malformed baskets are rejected with a 400, never a 500 or a partial sale'''
+import pytest
+from app import db
+from app.models.sales import Sale
+
+@pytest.mark.parametrize('body', [
+    [], [{'product_id': 1, 'quantity': 1}], 'basket', 3,
+    {'items': [1, 2]}, {'items': [[1, 1]]}, {'items': {'product_id': 1}},
+    {'items': [{'product_id': 1}]}, {'items': [{'product_id': 'x', 'quantity': 1}]},
+    {'items': [{'product_id': 1, 'quantity': 1}], 'payment_type': ['Cash']},
+])
+def test_malformed_json_basket_is_a_400(client, body):
+    response = client.post('/api/checkout', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_json_basket_is_sold(client):
+    response = client.post('/api/checkout', json={'items': [{'product_id': 1, 'quantity': 2}], 'payment_type': 'Card'})
+    assert response.status_code == 201
+    assert response.get_json()['items'] == [{'product_id': 1, 'quantity': 2}]
+
+def test_form_basket_with_unmatched_quantities_is_refused(app, client):
+    client.post('/record_sale', data={'product_id': ['1', '2'], 'quantity': ['1'], 'payment_type': 'Cash'})
+    with app.app_context():
+        assert db.session.query(Sale).count() == 0
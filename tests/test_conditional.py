@@ -0,0 +1,40 @@
+'''Conditional GETs must never answer 304 for a body that has changed'''
+
+def revalidate(client, path, response):
+    '''Ask again with only the date validator, as some clients do'''
+    return client.get(path, headers={'If-Modified-Since': response.headers['Last-Modified']})
+
+def test_stock_batch_changes_when_a_product_is_deleted(client):
+    path = '/api/product_stock?ids=1,2,3'
+    first = client.get(path)
+    assert first.status_code == 200 and first.get_json()['missing'] == []
+
+    assert client.get('/delete_product/2').status_code == 302
+    again = revalidate(client, path, first)
+    assert again.status_code == 200
+    assert again.get_json()['missing'] == [2]
+
+def test_inventory_page_changes_when_a_product_is_deleted(client):
+    client.get('/inventory')  # shows (and clears) the login flash message
+    first = client.get('/inventory')
+    assert first.status_code == 200
+
+    assert client.get('/delete_product/2').status_code == 302
+    client.get('/inventory')  # the "deleted" flash message
+    assert revalidate(client, '/inventory', first).status_code == 200
+
+def test_unchanged_page_is_not_modified(client):
+    client.get('/inventory')
+    first = client.get('/inventory')
+    assert client.get('/inventory', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+def test_product_stock_changes_within_the_same_second(client, record_sales):
+    path = '/api/product_stock/1'
+    first = client.get(path)
+    assert first.status_code == 200 and 'Last-Modified' in first.headers
+
+    record_sales(1)  # sells product 1, usually within the second Last-Modified names
+    again = revalidate(client, path, first)
+    assert again.status_code == 200
+    assert again.get_json()['stock_level'] == first.get_json()['stock_level'] - 1
+    assert client.get(path, headers={'If-None-Match': again.headers['ETag']}).status_code == 304
@@ -0,0 +1,25 @@
+'''The live dashboard must resume its event stream from where its figures stand'''
+import re
+from app import checkout as checkout_module, db
+from app.models.events import LiveEvent
+
+def rendered(client):
+    '''(today_revenue shown, event id the page subscribes after)'''
+    html = client.get('/dashboard').get_data(as_text=True)
+    revenue = float(re.search(r'data-kpi="today_revenue" data-value="([\d.]+)"', html).group(1))
+    event_id = int(re.search(r'/api/v1/events\?after=(\d+)', html).group(1))
+    return revenue, event_id
+
+def test_cached_kpis_come_with_their_event_id(app, client, record_sales, monkeypatch):
+    record_sales(3)
+    revenue, event_id = rendered(client)
+
+    # A sale made by another worker process does not invalidate this process's cache
+    monkeypatch.setattr(checkout_module, 'invalidate_today', lambda: None)
+    with app.app_context():
+        checkout_module.checkout([(1, 2)], 'Cash')
+        newest = db.session.query(db.func.max(LiveEvent.id)).scalar()
+
+    # Still the cached figures, so the page must still resume from before the sale
+    assert rendered(client) == (revenue, event_id)
+    assert newest > event_id
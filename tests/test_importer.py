@@ -0,0 +1,25 @@
+'''Unreadable uploads are reported as import errors, never as a 500'''
+import io
+import pytest
+
+def upload(client, path, content, filename='products.csv'):
+    return client.post(path, data={'file': (io.BytesIO(content), filename)}, content_type='multipart/form-data')
+
+@pytest.mark.parametrize('content', [
+    b'name,category,price\nCaf\xe9,Drinks,2.5\n',     # Latin-1, not UTF-8
+    b'\xff\xfe\x00n\x00a\x00m\x00e',                  # UTF-16
+    b'name,category,price\n"' + b'x' * 200000 + b'",Drinks,2.5\n',  # beyond the csv field size limit
+])
+def test_unreadable_csv_is_a_400(client, content):
+    response = upload(client, '/api/import_products', content)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_unreadable_csv_is_flashed_on_the_html_form(client):
+    response = upload(client, '/import_products', b'name,category,price\nCaf\xe9,Drinks,2.5\n')
+    assert response.status_code == 302
+    assert 'Import failed' in client.get('/inventory').get_data(as_text=True)
+
+def test_valid_csv_is_imported(client):
+    response = upload(client, '/api/import_products', b'name,category,price,stock_level\nTea,Drinks,2.5,4\n')
+    assert response.get_json()['created'] == 1
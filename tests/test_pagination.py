@@ -0,0 +1,20 @@
+'''Tampered inventory cursors are ignored, never passed to the database'''
+import pytest
+from app.pagination import encode_cursor
+
+@pytest.mark.parametrize('sort_by, value', [
+    ('price', [1, 2]), ('price', {'a': 1}), ('price', 'cheap'), ('stock', 1.5), ('stock', True),
+    ('name', 3), ('created_at', 42), ('created_at', 'yesterday'),
+])
+def test_malformed_cursor_value_restarts_the_listing(client, sort_by, value):
+    cursor = encode_cursor(sort_by, value, 5)
+    response = client.get('/api/products', query_string={'sort_by': sort_by, 'after': cursor})
+    assert response.status_code == 200
+
+def test_well_formed_cursor_pages_on(client):
+    first = client.get('/api/products', query_string={'sort_by': 'price', 'sort_order': 'asc', 'per_page': 5})
+    cursor = first.get_json()['next_cursor']
+    second = client.get('/api/products', query_string={'sort_by': 'price', 'sort_order': 'asc',
+                                                        'per_page': 5, 'after': cursor})
+    ids = [product['product_id'] for product in first.get_json()['products'] + second.get_json()['products']]
+    assert len(set(ids)) == 10
@@ -0,0 +1,25 @@
+'''Products with sales history are never hard-deleted, so sales and reports stay consistent'''
+from app import db
+from app.models.products import Product
+from app.models.sales import Sale, SalesItem
+
+def test_sold_product_cannot_be_deleted(app, client, record_sales):
+    record_sales(1)  # sells product 1
+    client.get('/delete_product/1')
+    with app.app_context():
+        assert db.session.get(Product, 1) is not None
+        assert db.session.query(SalesItem).count() == 1
+
+def test_unsold_product_is_deleted(app, client):
+    client.get('/delete_product/2')
+    with app.app_context():
+        assert db.session.get(Product, 2) is None
+
+def test_bulk_delete_keeps_sold_products(app, client, record_sales):
+    record_sales(2)  # sells products 1 and 2
+    client.post('/bulk_products', data={'action': 'delete', 'product_ids': ['1', '2', '3']})
+    with app.app_context():
+        assert {product.id for product in Product.query.filter(Product.id.in_([1, 2, 3]))} == {1, 2}
+        sale_total = db.session.query(db.func.sum(Sale.total_amount)).scalar()
+        line_total = db.session.query(db.func.sum(SalesItem.quantity * SalesItem.unit_price)).scalar()
+        assert sale_total == line_total
@@ -0,0 +1,15 @@
+'''Pages must load in a fixed number of queries, however many sales exist'''
+import pytest
+
+def query_count(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return int(response.headers['X-Query-Count'])
+
+@pytest.mark.parametrize('path, expected', [('/sales', 3), ('/dashboard', 5)])
+def test_query_count_is_fixed(client, record_sales, path, expected):
+    record_sales(5)
+    assert query_count(client, path) == expected
+
+    record_sales(40)
+    assert query_count(client, path) == expected
@@ -0,0 +1,12 @@
+'''A non-empty inventory search never falls back to the unfiltered listing'''
+import pytest
+from app import db
+from app.models.products import Product
+
+@pytest.mark.parametrize('term, expected', [('%%', []), ('-', ['Drill - cordless']), ('drill', ['Drill - cordless'])])
+def test_search_without_word_tokens_is_matched_literally(app, client, term, expected):
+    with app.app_context():
+        db.session.add(Product(name='Drill - cordless', category='Tools', cost=10.0, price=20.0, stock_level=3))
+        db.session.commit()
+    response = client.get('/api/products', query_string={'search': term})
+    assert [product['name'] for product in response.get_json()['products']] == expected
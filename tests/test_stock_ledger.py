@@ -0,0 +1,73 @@
+'''The movement ledger must add up to stock_level, including for stock that predates it'''
+from datetime import datetime, timedelta
+from app import db
+from app.models.products import Product
+from app.stock_ledger import open_ledger, reconcile, stock_at, take_snapshot
+
+# The fixture's products are inserted directly, as on a database that
+# existed before the ledger: they have stock but no movements
+
+def test_changes_before_the_ledger_is_opened_are_kept(app, client):
+    client.post('/record_sale', data={'product_id': '1', 'quantity': '15', 'payment_type': 'Cash'})
+    client.post('/update_stock', data={'product_id': '2', 'stock_level': '450'})
+
+    with app.app_context():
+        open_ledger()
+        assert stock_at(product_ids=[1, 2, 3]) == {1: 485, 2: 450, 3: 500}
+        assert reconcile() == []
+        assert open_ledger() == 0
+
+def test_opening_after_a_snapshot_counts_from_the_snapshot(app, client):
+    client.post('/record_sale', data={'product_id': '1', 'quantity': '5', 'payment_type': 'Cash'})
+    with app.app_context():
+        take_snapshot(datetime.utcnow())
+    client.post('/record_sale', data={'product_id': '1', 'quantity': '5', 'payment_type': 'Cash'})
+
+    with app.app_context():
+        open_ledger()
+        assert stock_at(product_ids=[1]) == {1: 490}
+        assert stock_at(product_ids=[1]) == {1: Product.query.get(1).stock_level}
+        assert reconcile() == []
+
+def test_stock_at_converts_offsets_to_utc(app, client):
+    with app.app_context():
+        open_ledger()
+    local = datetime.utcnow().replace(microsecond=0) + timedelta(hours=2)
+    for at in (local.isoformat() + '+02:00', (local - timedelta(hours=2)).isoformat() + 'Z'):
+        response = client.get('/api/stock_at', query_string={'at': at, 'ids': '1'})
+        assert response.status_code == 200
+        assert response.get_json()['at'] == (local - timedelta(hours=2)).isoformat()
+
+def test_opening_corrects_earlier_snapshots(app, client):
+    sell = {'product_id': '1', 'quantity': '5', 'payment_type': 'Cash'}
+    client.post('/record_sale', data=sell)
+    with app.app_context():
+        first = datetime.utcnow()
+        take_snapshot(first)
+    client.post('/record_sale', data=sell)
+    with app.app_context():
+        second = datetime.utcnow()
+        take_snapshot(second)
+    client.post('/record_sale', data=sell)
+
+    with app.app_context():
+        open_ledger()
+        between = first + (second - first) / 2
+        assert stock_at(between, product_ids=[1, 2]) == {1: 495, 2: 500}
+        assert stock_at(second, product_ids=[1, 2]) == {1: 490, 2: 500}
+        assert stock_at(product_ids=[1, 2]) == {1: 485, 2: 500}
+        assert reconcile() == []
+
+def test_drift_on_products_added_later_is_reported(app, client):
+    client.post('/record_sale', data={'product_id': '1', 'quantity': '5', 'payment_type': 'Cash'})
+    client.post('/add_product', data={'name': 'Late arrival', 'category': 'New', 'cost': '1', 'price': '2',
+                                      'stock': '10'})
+    with app.app_context():
+        late = Product.query.filter_by(name='Late arrival').one()
+        late.stock_level = 7  # changed behind the ledger's back
+        db.session.commit()
+
+        open_ledger()
+        assert [(row.id, row.stock_level, row.ledger_level) for row in reconcile()] == [(late.id, 7, 10)]
+        assert open_ledger() == 0
+        assert len(reconcile()) == 1